@@ -1,5 +1,10 @@
 # Importa bibliotecas
 import pandas as pd
 import numpy as np
-import os, time
-from datetime import datetime, timedelta
\ No newline at end of file
+import os, sys, time, json, random, hashlib, threading, functools
+import requests
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, quote
+from io import BytesIO
+from email.utils import parsedate_to_datetime
@@ -1,96 +1,751 @@
 
-# Retenta ler um CSV se falhar download
-def ler_csv(*args, **kwargs):
-  max_tentativas = 5
-  intervalo = 2
-  tentativas = 0
-  while tentativas < max_tentativas:
+# Definições e configurações globais
+max_coletas_simultaneas = 8 # nº máximo de coletas em paralelo
+max_coletas_por_host = 4 # nº máximo de coletas simultâneas em um mesmo host
+max_janelas_simultaneas = 4 # nº máximo de janelas de uma série diária baixadas em paralelo
+coleta_incremental = os.environ.get("CORECON_INCREMENTAL", "0") == "1" # coleta só dados recentes e mescla ao histórico salvo
+janela_revisao_dias = 90 # dias antes da última observação salva que são coletados novamente (revisões)
+arquivos_historico = {
+    "Diária": "dados/df_diaria.parquet",
+    "Mensal": "dados/df_mensal.parquet",
+    "Trimestral": "dados/df_trimestral.parquet",
+    "Anual": "dados/df_anual.parquet"
+    }
+regras_agregacao_padrao = {"selic": "first"} # regra de conversão de frequência das séries sem regra na coluna Agregação dos metadados (demais: média)
+tratamento_incremental = os.environ.get("CORECON_TRATAMENTO_INCREMENTAL", "0") == "1" # recalcula só os períodos a partir do corte e atualiza a base salva
+modo_compacto = "--compacto" in sys.argv or os.environ.get("CORECON_COMPACTO", "0") == "1" # reduz a memória das tabelas (float32 declarado, colunas esparsas e categorias)
+limite_esparso = 0.8 # fração mínima de valores ausentes para manter uma coluna esparsa em memória no modo compacto
+url_metadados = "https://docs.google.com/spreadsheets/d/1x8Ugm7jVO7XeNoxiaFPTPm1mfVc3JUNvvVqVjCioYmE/export?format=xlsx"
+arquivo_metadados = "dados/metadados.parquet" # retrato local da planilha de metadados
+arquivo_versao_metadados = "dados/metadados.json" # hash e data do retrato local
+pasta_bruto = "bruto" # zona bruta: um Parquet por série coletada e o manifesto das coletas
+arquivo_manifesto_bruto = "bruto/manifesto.json" # data de coleta, linhas e arquivo de cada série na zona bruta
+max_series_por_lote_sidra = 50 # nº máximo de séries (ex.: municípios) reunidas em uma requisição ao SIDRA
+validade_bruto = 6 * 3600 # segundos em que uma série da zona bruta é reaproveitada ao executar a coleta de novo
+arquivo_marcas_dagua = "dados/marcas_dagua.json" # última observação (hash) de cada série na base disponibilizada
+pasta_cache = os.environ.get("CORECON_CACHE", "cache") # pasta do cache em disco das respostas HTTP
+modo_offline = "--offline" in sys.argv or os.environ.get("CORECON_OFFLINE", "0") == "1" # usa apenas respostas do cache
+validade_cache = { # validade (em segundos) das respostas em cache, por fonte
+    "BCB/SGS": 6 * 3600,
+    "BCB/ODATA": 6 * 3600,
+    "IPEADATA": 12 * 3600,
+    "IBGE/SIDRA": 12 * 3600,
+    "FRED": 12 * 3600,
+    "IFI": 24 * 3600,
+    "Metadados": 3600
+    }
+tempo_limite_conexao = 10 # segundos de espera para abrir uma conexão HTTP
+tempo_limite_leitura = 120 # segundos de espera por dados de uma resposta HTTP
+conexoes_por_host = 16 # conexões persistentes mantidas por host na sessão HTTP
+max_tentativas_http = 5 # nº máximo de tentativas de uma requisição HTTP
+espera_base = 1 # segundos de espera base do recuo exponencial entre tentativas
+espera_maxima = 60 # segundos de espera máxima entre tentativas
+status_retentaveis = [429, 500, 502, 503, 504] # códigos HTTP que justificam nova tentativa
+requisicoes_por_segundo = { # taxa máxima de requisições por host (padrão em None)
+    "api.bcb.gov.br": 5,
+    "olinda.bcb.gov.br": 2,
+    "www.ipeadata.gov.br": 4,
+    "apisidra.ibge.gov.br": 4,
+    "fred.stlouisfed.org": 4,
+    None: 5
+    }
+modo_gravacao = "--gravar" in sys.argv or os.environ.get("CORECON_GRAVAR", "0") == "1" # grava as respostas reais das fontes (e da IA) como fixtures
+modo_replay = "--replay" in sys.argv or os.environ.get("CORECON_REPLAY", "0") == "1" # responde às requisições com as fixtures gravadas, sem rede
+pasta_fixtures = os.environ.get("CORECON_FIXTURES", "fixtures") # pasta das fixtures dos modos de gravação e replay
+arquivo_referencia_fixtures = os.path.join(pasta_fixtures, "referencia.json") # data de referência ("hoje") da gravação das fixtures
+pasta_cache = os.path.join(pasta_fixtures, "cache") if modo_replay else pasta_cache # no replay, o cache fica à parte, para que respostas gravadas não alimentem coletas reais
+latencia_replay = float(os.environ.get("CORECON_LATENCIA", "0")) # segundos de latência simulada por requisição no replay
+taxa_falhas_replay = float(os.environ.get("CORECON_TAXA_FALHAS", "0")) # fração das requisições do replay que falham (conexão ou HTTP 503)
+semente_replay = 1984 # semente do sorteio das falhas simuladas no replay
+limite_falhas_circuito = 8 # falhas seguidas em um host que abrem o circuito
+pausa_circuito = 120 # segundos em que o host fica bloqueado após abrir o circuito
+tamanho_bloco_csv = 50000 # linhas por bloco na leitura em blocos dos CSVs do Focus
+anos_por_pagina_odata = 4 # anos de dados do Focus por página nas consultas ODATA (0 desativa a paginação)
+max_paginas_simultaneas = 4 # nº máximo de páginas de uma consulta ODATA baixadas em paralelo
+data_inicio_paginas_odata = "2000-01-01" # data inicial da paginação quando a série não declara outra
+validade_paginas_fechadas = 30 * 24 * 3600 # validade em cache de páginas cujo período já terminou
+expectativas_focus = { # expectativas do Focus agregadas por média no tratamento: formato de DataReferencia, dias por unidade do horizonte, horizonte desejado (None = todos) e frequência de saída
+    "expec_ipca_top5_curto_prazo": {"referencia": "%m/%Y", "unidade": 30, "horizonte": 1, "freq": "M"},
+    "expec_ipca_top5_medio_prazo": {"referencia": "%m/%Y", "unidade": 30, "horizonte": 6, "freq": "M"},
+    "expec_ipca_12m": {"referencia": None, "unidade": None, "horizonte": None, "freq": "M"},
+    "expec_selic": {"referencia": "%Y", "unidade": 365, "horizonte": 1, "freq": "M"},
+    "expec_cambio": {"referencia": "%m/%Y", "unidade": 30, "horizonte": 1, "freq": "M"},
+    "expec_primario": {"referencia": "%Y", "unidade": 365, "horizonte": 1, "freq": "M"},
+    "expec_pib": {"referencia": "T/%Y", "unidade": 30, "horizonte": 9, "freq": "Q"}
+    }
+esquemas = { # esquemas de leitura por fonte: nomes, tipos, formatos de data e marcadores de NA
+    "BCB/SGS": {
+        "tipos": {"valor": "float64"},
+        "datas": {"data": "%d/%m/%Y"}
+        },
+    "BCB/ODATA": {
+        "tipos": {"Media": "float64", "Mediana": "float64", "DesvioPadrao": "float64", "Minimo": "float64", "Maximo": "float64"},
+        "datas": {"Data": "ISO8601"}
+        },
+    "Focus/Mensal": {
+        "tipos": {"Mediana": "float64"},
+        "datas": {"Data": "ISO8601", "DataReferencia": "%m/%Y"}
+        },
+    "Focus": {
+        "tipos": {"Mediana": "float64"},
+        "datas": {"Data": "ISO8601"}
+        },
+    "IPEADATA": {
+        "renomear": {"VALDATA": "data", "VALVALOR": "valor"},
+        "tipos": {"valor": "float64"},
+        "datas": {"data": "ISO8601"},
+        "utc": True
+        },
+    "IBGE/SIDRA": {
+        "renomear": {"D3C": "data", "V": "valor"},
+        "tipos": {"valor": "float64"},
+        "na": ["Valor", "...", "-", "..", "X"],
+        "descartar_na": ["valor"]
+        },
+    "FRED": {
+        "datas": {"DATE": "ISO8601", "observation_date": "ISO8601"},
+        "na": ["."]
+        }
+    }
+
+# Cria a sessão HTTP compartilhada por todas as coletas, reaproveitando conexões
+# (keep-alive) por host e aceitando respostas comprimidas
+def cria_sessao_http():
+  sessao = requests.Session()
+  sessao.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+  adaptador = requests.adapters.HTTPAdapter(pool_connections = conexoes_por_host, pool_maxsize = conexoes_por_host)
+  sessao.mount("http://", adaptador)
+  sessao.mount("https://", adaptador)
+  return sessao
+
+sessao_http = cria_sessao_http()
+
+# Caminho no cache dos metadados de uma URL (chave = hash SHA-256 da URL)
+def caminho_cache_url(url):
+  return os.path.join(pasta_cache, "urls", hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+# Caminho no cache de um conteúdo (endereçado pelo hash SHA-256 do conteúdo)
+def caminho_cache_conteudo(hash_conteudo):
+  return os.path.join(pasta_cache, "conteudo", hash_conteudo)
+
+# Grava um arquivo de forma atômica, evitando leituras de arquivos incompletos
+def grava_atomico(caminho, conteudo):
+  os.makedirs(os.path.dirname(caminho), exist_ok = True)
+  temporario = f"{caminho}.{threading.get_ident()}.tmp"
+  with open(temporario, "wb") as arquivo:
+    arquivo.write(conteudo)
+  os.replace(temporario, caminho)
+
+# Estado compartilhado entre threads da política de requisições por host
+trava_hosts = threading.Lock()
+baldes_hosts = {} # host: [fichas disponíveis, instante da última reposição]
+circuitos_hosts = {} # host: [falhas seguidas, instante até o qual o circuito fica aberto]
+
+# Aguarda uma ficha do balde do host, respeitando a taxa máxima de requisições
+def aguarda_limite_taxa(host):
+  taxa = requisicoes_por_segundo.get(host, requisicoes_por_segundo[None])
+  while True:
+    with trava_hosts:
+      agora = time.monotonic()
+      fichas, ultima = baldes_hosts.get(host, [taxa, agora])
+      fichas = min(taxa, fichas + (agora - ultima) * taxa)
+      if fichas >= 1:
+        baldes_hosts[host] = [fichas - 1, agora]
+        return
+      baldes_hosts[host] = [fichas, agora]
+      espera = (1 - fichas) / taxa
+    time.sleep(espera)
+
+# Registra o resultado de uma requisição no circuito do host: falhas seguidas
+# acima do limite bloqueiam o host por pausa_circuito segundos
+def registra_circuito(host, sucesso):
+  with trava_hosts:
+    falhas, aberto_ate = circuitos_hosts.get(host, [0, 0])
+    if sucesso:
+      circuitos_hosts[host] = [0, 0]
+    else:
+      falhas += 1
+      if falhas >= limite_falhas_circuito:
+        aberto_ate = time.monotonic() + pausa_circuito
+      circuitos_hosts[host] = [falhas, aberto_ate]
+
+# Calcula a espera antes de uma nova tentativa: usa Retry-After se informado
+# pelo servidor, senão recuo exponencial com variação aleatória (full jitter)
+def calcula_espera(tentativa, resposta = None):
+  if resposta is not None and resposta.headers.get("Retry-After"):
+    valor = resposta.headers["Retry-After"]
+    try:
+      return min(espera_maxima, float(valor))
+    except ValueError:
       try:
-          df = pd.read_csv(*args, **kwargs)
-          return df
-      except Exception as e:
-          tentativas += 1
-          print(f"Tentativa {tentativas} falhou: {e}")
-          time.sleep(intervalo)
-  print(f"Falha após {max_tentativas} tentativas.")
-  return None
+        return min(espera_maxima, max(0, (parsedate_to_datetime(valor) - datetime.now(parsedate_to_datetime(valor).tzinfo)).total_seconds()))
+      except (TypeError, ValueError):
+        pass
+  return random.uniform(0, min(espera_maxima, espera_base * 2 ** tentativa))
+
+# Data usada como "hoje" nas consultas (fim das janelas do SGS, páginas do Focus,
+# últimos períodos do SIDRA), no corte do tratamento e nos prompts da IA. No modo
+# gravação, é registrada junto às fixtures; no replay, é lida de lá, para que as
+# URLs sejam as mesmas da gravação em qualquer dia
+def define_data_hoje():
+  if modo_replay:
+    if not os.path.exists(arquivo_referencia_fixtures):
+      raise Exception(f"Modo replay: {arquivo_referencia_fixtures} não encontrado; grave as fixtures de novo")
+    with open(arquivo_referencia_fixtures) as arquivo:
+      return pd.Timestamp(json.load(arquivo)["hoje"])
+  hoje = pd.Timestamp.today()
+  if modo_gravacao:
+    os.makedirs(pasta_fixtures, exist_ok = True)
+    grava_atomico(arquivo_referencia_fixtures, json.dumps({"hoje": hoje.isoformat()}).encode())
+  return hoje
+
+data_hoje = define_data_hoje()
+
+# Caminho de uma fixture (respostas gravadas) a partir de uma chave (URL etc.)
+def caminho_fixture(chave, extensao):
+  return os.path.join(pasta_fixtures, hashlib.sha256(chave.encode()).hexdigest() + extensao)
+
+# Monta uma resposta HTTP (requests.Response) a partir de bytes em memória
+def monta_resposta(url, status, cabecalhos, conteudo):
+  resposta = requests.Response()
+  resposta.url = url
+  resposta.status_code = status
+  resposta.headers = requests.structures.CaseInsensitiveDict(cabecalhos)
+  resposta.raw = BytesIO(conteudo)
+  return resposta
+
+# Transporte que faz a requisição real e grava a resposta como fixture; omite os
+# cabeçalhos condicionais para que o corpo completo seja sempre gravado
+def transporte_gravacao(url, headers = {}, timeout = None, stream = False):
+  headers = {k: v for k, v in headers.items() if k not in ("If-None-Match", "If-Modified-Since")}
+  resposta = sessao_http.get(url, headers = headers, timeout = timeout)
+  if resposta.status_code in status_retentaveis:
+    return resposta
+  cabecalhos = {k: v for k, v in resposta.headers.items() if k in ("Content-Type", "ETag", "Last-Modified")}
+  os.makedirs(pasta_fixtures, exist_ok = True)
+  grava_atomico(caminho_fixture(url, ".corpo"), resposta.content)
+  grava_atomico(caminho_fixture(url, ".json"), json.dumps({
+      "url": url, "status": resposta.status_code, "cabecalhos": cabecalhos
+      }).encode())
+  return monta_resposta(url, resposta.status_code, cabecalhos, resposta.content)
+
+sorteio_replay = random.Random(semente_replay)
+trava_replay = threading.Lock()
+
+# Transporte que responde com as fixtures gravadas, sem acessar a rede, com
+# latência e taxa de falhas (conexão recusada ou HTTP 503) configuráveis
+def transporte_replay(url, headers = {}, timeout = None, stream = False):
+  if latencia_replay > 0:
+    time.sleep(latencia_replay)
+  with trava_replay:
+    sorteio = sorteio_replay.random()
+  if sorteio < taxa_falhas_replay / 2:
+    raise requests.ConnectionError(f"Falha simulada de conexão: {url}")
+  if sorteio < taxa_falhas_replay:
+    return monta_resposta(url, 503, {"Retry-After": "0"}, b"")
+  if not os.path.exists(caminho_fixture(url, ".json")):
+    raise Exception(f"Modo replay: {url} não tem fixture gravada em {pasta_fixtures}")
+  with open(caminho_fixture(url, ".json")) as arquivo:
+    meta = json.load(arquivo)
+  with open(caminho_fixture(url, ".corpo"), "rb") as arquivo:
+    return monta_resposta(url, meta["status"], meta["cabecalhos"], arquivo.read())
+
+# Transporte usado por requisicao_http: qualquer função com a assinatura de
+# sessao_http.get pode ser injetada aqui (ex.: para medir desempenho)
+transporte_http = transporte_replay if modo_replay else transporte_gravacao if modo_gravacao else sessao_http.get
+
+# Faz uma requisição GET com limite de taxa e circuito por host, retentando
+# erros de conexão e respostas retentáveis com recuo exponencial
+def requisicao_http(url, cabecalhos = {}, stream = False):
+
+  host = extrai_host(url)
+  for tentativa in range(max_tentativas_http):
+    with trava_hosts:
+      aberto_ate = circuitos_hosts.get(host, [0, 0])[1]
+    if aberto_ate > time.monotonic():
+      raise Exception(f"Circuito aberto para {host} após falhas seguidas; requisição a {url} não realizada")
+
+    aguarda_limite_taxa(host)
+    resposta = None
+    try:
+      resposta = transporte_http(url, headers = cabecalhos, timeout = (tempo_limite_conexao, tempo_limite_leitura), stream = stream)
+      if resposta.status_code not in status_retentaveis:
+        registra_circuito(host, True)
+        return resposta
+      erro = f"HTTP {resposta.status_code}"
+      resposta.close()
+    except (requests.ConnectionError, requests.Timeout) as e:
+      erro = e
+
+    registra_circuito(host, False)
+    if tentativa + 1 < max_tentativas_http:
+      espera = calcula_espera(tentativa, resposta)
+      print(f"Tentativa {tentativa + 1} de {url} falhou ({erro}); nova tentativa em {espera:.1f}s")
+      time.sleep(espera)
+
+  raise Exception(f"Falha após {max_tentativas_http} tentativas: {url} ({erro})")
+
+# Grava em disco, em blocos, o corpo de uma resposta HTTP sem carregá-lo inteiro
+# na memória e retorna o hash SHA-256 do conteúdo
+def grava_resposta(resposta):
+  os.makedirs(os.path.join(pasta_cache, "conteudo"), exist_ok = True)
+  temporario = os.path.join(pasta_cache, "conteudo", f"{threading.get_ident()}.tmp")
+  hash_conteudo = hashlib.sha256()
+  with open(temporario, "wb") as arquivo:
+    for bloco in resposta.iter_content(chunk_size = 1024 * 1024):
+      hash_conteudo.update(bloco)
+      arquivo.write(bloco)
+  hash_conteudo = hash_conteudo.hexdigest()
+  os.replace(temporario, caminho_cache_conteudo(hash_conteudo))
+  return hash_conteudo
+
+travas_urls = {} # url: trava, para que requisições idênticas simultâneas baixem uma só vez
+
+# Baixa uma URL para o cache em disco e retorna o caminho do arquivo: respostas
+# dentro da validade da fonte são reutilizadas, as vencidas são revalidadas com
+# ETag/Last-Modified e, no modo offline, apenas o cache é usado. Pedidos
+# simultâneos da mesma URL aguardam o primeiro e reaproveitam o que ele baixou
+def baixa_arquivo(url, fonte = None, validade = None):
+
+  with trava_hosts:
+    trava = travas_urls.setdefault(url, threading.Lock())
+  with trava:
+    return baixa_arquivo_cache(url, fonte, validade)
+
+def baixa_arquivo_cache(url, fonte = None, validade = None):
+
+  if validade is None:
+    validade = validade_cache.get(fonte, 0)
+
+  # No replay, o cache (à parte, ver pasta_cache) é ignorado e toda requisição é
+  # respondida pelas fixtures
+  arquivo_url = caminho_cache_url(url)
+  meta = None
+  if os.path.exists(arquivo_url) and not modo_replay:
+    with open(arquivo_url) as arquivo:
+      meta = json.load(arquivo)
+    if not os.path.exists(caminho_cache_conteudo(meta["conteudo"])):
+      meta = None
+
+  if meta is not None and not modo_gravacao and (modo_offline or time.time() - meta["baixado_em"] < validade):
+    return caminho_cache_conteudo(meta["conteudo"])
+  if modo_offline and not modo_replay:
+    raise Exception(f"Modo offline: {url} não está no cache")
+
+  cabecalhos = {}
+  if meta is not None and meta.get("etag"):
+    cabecalhos["If-None-Match"] = meta["etag"]
+  if meta is not None and meta.get("last_modified"):
+    cabecalhos["If-Modified-Since"] = meta["last_modified"]
+
+  # Retenta também quedas de conexão durante a transferência do corpo da resposta
+  for tentativa in range(max_tentativas_http):
+    try:
+      with requisicao_http(url, cabecalhos, stream = True) as resposta:
+        if resposta.status_code == 304 and meta is not None:
+          hash_conteudo = meta["conteudo"]
+          etag = resposta.headers.get("ETag", meta.get("etag"))
+          last_modified = resposta.headers.get("Last-Modified", meta.get("last_modified"))
+        else:
+          resposta.raise_for_status()
+          hash_conteudo = grava_resposta(resposta)
+          etag = resposta.headers.get("ETag")
+          last_modified = resposta.headers.get("Last-Modified")
+      break
+    except (requests.exceptions.ChunkedEncodingError, requests.ConnectionError) as e:
+      if tentativa + 1 == max_tentativas_http:
+        raise
+      print(f"Transferência de {url} interrompida ({e}); nova tentativa")
+      time.sleep(calcula_espera(tentativa))
+
+  grava_atomico(arquivo_url, json.dumps({
+      "url": url,
+      "baixado_em": time.time(),
+      "etag": etag,
+      "last_modified": last_modified,
+      "conteudo": hash_conteudo
+      }).encode())
+  return caminho_cache_conteudo(hash_conteudo)
+
+# Baixa o conteúdo de uma URL (via cache em disco, ver baixa_arquivo)
+def baixa_url(url, fonte = None, validade = None):
+  with open(baixa_arquivo(url, fonte, validade), "rb") as arquivo:
+    return arquivo.read()
+
+# Opções de leitura do pandas (tipos e marcadores de NA) de um esquema, para que
+# a conversão seja feita pelo próprio leitor de CSV
+def opcoes_leitura(esquema):
+  opcoes = {"dtype": esquema.get("tipos", {})}
+  if esquema.get("na"):
+    opcoes["na_values"] = esquema["na"]
+  return opcoes
+
+# Aplica um esquema a um DataFrame de forma vetorizada: renomeia colunas, troca
+# marcadores de NA, converte tipos e datas e descarta linhas sem valor
+def aplica_esquema(df, esquema):
+
+  df = df.rename(columns = esquema.get("renomear", {}))
+  na = esquema.get("na", [])
+
+  for coluna, tipo in esquema.get("tipos", {}).items():
+    if coluna in df.columns and df[coluna].dtype != tipo:
+      serie = df[coluna].mask(df[coluna].isin(na)) if na else df[coluna]
+      df[coluna] = pd.to_numeric(serie).astype(tipo)
+
+  for coluna, formato in esquema.get("datas", {}).items():
+    if coluna in df.columns and not pd.api.types.is_datetime64_any_dtype(df[coluna]):
+      df[coluna] = pd.to_datetime(df[coluna], format = formato, utc = esquema.get("utc", False))
+
+  if esquema.get("descartar_na"):
+    df = df.dropna(subset = esquema["descartar_na"])
+  return df
+
+# Lê um CSV em blocos, aplicando a cada bloco o esquema da fonte, um filtro
+# (função que recebe e retorna um DataFrame) e, opcionalmente, a média por grupo
+# de forma incremental (somas e contagens acumuladas), mantendo a memória
+# limitada ao tamanho do bloco
+def le_csv_em_blocos(filepath_or_buffer, filtro = None, agrupar_por = None, colunas_media = None, esquema = None, tamanho_bloco = tamanho_bloco_csv, **kwargs):
+
+  if esquema is not None:
+    kwargs = {**opcoes_leitura(esquema), **kwargs}
+
+  blocos = []
+  acumulado = None
+  for bloco in pd.read_csv(filepath_or_buffer, chunksize = tamanho_bloco, **kwargs):
+    if esquema is not None:
+      bloco = aplica_esquema(bloco, esquema)
+    if filtro is not None:
+      bloco = filtro(bloco)
+    if agrupar_por is None:
+      blocos.append(bloco)
+      continue
+    grupos = bloco.groupby(agrupar_por)[colunas_media]
+    parcial = pd.concat([grupos.sum(), grupos.count()], axis = "columns", keys = ["soma", "n"])
+    acumulado = parcial if acumulado is None else acumulado.add(parcial, fill_value = 0)
+
+  if agrupar_por is None:
+    return pd.concat(blocos) if len(blocos) > 1 else blocos[0]
+  return (acumulado["soma"] / acumulado["n"].where(acumulado["n"] > 0)).sort_index()
+
+# Lê um CSV; URLs são baixadas via cache em disco, com a política de retentativas
+# de requisicao_http, e falhas retornam None
+def ler_csv(*args, fonte = None, **kwargs):
+  url = kwargs.get("filepath_or_buffer")
+  try:
+    if isinstance(url, str) and url.startswith("http"):
+      kwargs["filepath_or_buffer"] = BytesIO(baixa_url(url, fonte))
+    return pd.read_csv(*args, **kwargs)
+  except Exception as e:
+    print(f"Falha ao ler {url}: {e}")
+    return None
 
 # Coleta dados da API do Banco Central (SGS)
-def coleta_bcb_sgs(codigo, nome, freq, data_inicio = "01/01/2000", data_fim = (pd.to_datetime("today") + pd.offsets.DateOffset(months = 36)).strftime("%d/%m/%Y")):
+def coleta_bcb_sgs(codigo, nome, freq, data_inicio = "01/01/2000", data_fim = (data_hoje + pd.offsets.DateOffset(months = 36)).strftime("%d/%m/%Y"), intervalo_anos = 5, incremental = coleta_incremental, janela_revisao = janela_revisao_dias):
   
+  # No modo incremental, coleta a partir da última data salva menos a janela de revisão
+  historico = le_historico(nome, freq) if incremental else None
+  if historico is not None:
+    data_inicio = max(
+        datetime.strptime(data_inicio, "%d/%m/%Y"),
+        historico.index.max() - timedelta(days = int(janela_revisao))
+        ).strftime("%d/%m/%Y")
+
   if freq == "Diária":
-    datas_inicio = split_date_range(data_inicio, data_fim)
+    datas_inicio = split_date_range(data_inicio, data_fim, int(intervalo_anos))
   else:
     datas_inicio = [(data_inicio, data_fim)]
 
+  # Uma janela que falha invalida a série inteira: descartá-la deixaria um buraco
+  # de anos na base, que a coleta incremental não voltaria a preencher
+  def coleta_janela(d):
+    url = f"https://api.bcb.gov.br/dados/serie/bcdata.sgs.{codigo}/dados?formato=csv&dataInicial={d[0]}&dataFinal={d[1]}"
+    resposta = ler_csv(filepath_or_buffer = url, fonte = "BCB/SGS", sep = ";", decimal = ",", **opcoes_leitura(esquemas["BCB/SGS"]))
+    if resposta is None:
+      raise Exception(f"Falha na coleta da janela {d[0]} a {d[1]} da série {codigo} ({nome})")
+    return resposta
+
   try:
     print(f"Coletando a série {codigo} ({nome})")
-    resposta = []
-    for d in datas_inicio:
-      url = f"https://api.bcb.gov.br/dados/serie/bcdata.sgs.{codigo}/dados?formato=csv&dataInicial={d[0]}&dataFinal={d[1]}"
-      resposta.append(ler_csv(filepath_or_buffer = url, sep = ";", decimal = ","))
+    if len(datas_inicio) > 1:
+      with ThreadPoolExecutor(max_workers = max_janelas_simultaneas) as executor:
+        resposta = list(executor.map(coleta_janela, datas_inicio))
+    else:
+      resposta = [coleta_janela(d) for d in datas_inicio]
     resposta = pd.concat(resposta)
   except:
     raise Exception(f"Falha na coleta da série {codigo} ({nome})")
   else:
-    return (
-        resposta
+    df = (
+        aplica_esquema(resposta, esquemas["BCB/SGS"])
         .rename(columns = {"valor": nome})
-        .assign(data = lambda x: pd.to_datetime(x.data, format = "%d/%m/%Y"))
         .set_index("data")
     )
+    # A API repete na janela seguinte a observação da data de início (1º de
+    # janeiro a cada intervalo_anos): mantém uma observação por data
+    df = df[~df.index.duplicated(keep = "last")]
+    if historico is not None:
+      df = mescla_historico(historico, df, pd.to_datetime(data_inicio, format = "%d/%m/%Y"))
+    return df
 
-# Coleta dados da API do Banco Central (ODATA)
-def coleta_bcb_odata(codigo, nome):
+# Acrescenta a uma consulta ODATA do BCB filtros ($filter), data mínima, seleção
+# de colunas ($select), ordenação ($orderby) e limite de linhas ($top), para que
+# a API retorne apenas o que o tratamento usa
+def monta_url_odata(url, filtro = None, colunas = None, data_inicio = None, ordem = None, limite = None):
 
-  url = codigo
+  base, _, consulta = url.partition("?")
+  parametros = [p for p in consulta.split("&") if p]
+
+  filtros = [filtro] if filtro is not None else []
+  if data_inicio is not None:
+    filtros.append(f"Data ge '{pd.to_datetime(data_inicio).strftime('%Y-%m-%d')}'")
+  if filtros:
+    novo_filtro = quote(" and ".join(f"({f})" for f in filtros), safe = "'()")
+    existente = [p for p in parametros if p.startswith("$filter=")]
+    parametros = [p for p in parametros if not p.startswith("$filter=")]
+    if existente:
+      novo_filtro = f"({existente[0][len('$filter='):]})%20and%20{novo_filtro}"
+    parametros.insert(0, f"$filter={novo_filtro}")
+
+  if colunas is not None:
+    parametros = [p for p in parametros if not p.startswith("$select=")]
+    parametros.append(f"$select={quote(colunas.replace(' ', ''), safe = ',')}")
+
+  if ordem is not None:
+    parametros = [p for p in parametros if not p.startswith("$orderby=")]
+    parametros.append(f"$orderby={quote(ordem)}")
+  if limite is not None:
+    parametros = [p for p in parametros if not p.startswith("$top=")]
+    parametros.append(f"$top={limite}")
+
+  return f"{base}?{'&'.join(parametros)}"
+
+# Divide uma consulta ODATA em páginas por intervalos da coluna Data, em ordem
+# cronológica; a última página não tem limite superior. Retorna pares (url,
+# fechada), sendo fechadas as páginas cujo período terminou há mais de 7 dias
+def pagina_url_odata(url, data_inicio, anos_por_pagina):
+  inicio = pd.to_datetime(data_inicio)
+  hoje = data_hoje.normalize()
+  paginas = []
+  while True:
+    fim = inicio + pd.DateOffset(years = anos_por_pagina)
+    if fim > hoje:
+      paginas.append((monta_url_odata(url, filtro = f"Data ge '{inicio.strftime('%Y-%m-%d')}'"), False))
+      return paginas
+    filtro = f"Data ge '{inicio.strftime('%Y-%m-%d')}' and Data lt '{fim.strftime('%Y-%m-%d')}'"
+    paginas.append((monta_url_odata(url, filtro = filtro), fim < hoje - pd.DateOffset(days = 7)))
+    inicio = fim
+
+# Coleta dados da API do Banco Central (ODATA); filtro, colunas e data_inicio
+# são repassados à API (ver monta_url_odata) e a consulta é dividida em páginas
+# de anos_por_pagina anos, baixadas em paralelo e retentadas individualmente
+def coleta_bcb_odata(codigo, nome, filtro = None, colunas = None, data_inicio = None, anos_por_pagina = anos_por_pagina_odata):
+
+  url = monta_url_odata(codigo, filtro, colunas, data_inicio)
+  if int(anos_por_pagina) > 0:
+    paginas = pagina_url_odata(url, data_inicio if data_inicio is not None else data_inicio_paginas_odata, int(anos_por_pagina))
+  else:
+    paginas = [(url, False)]
+
+  def coleta_pagina(pagina):
+    return le_csv_em_blocos(
+        baixa_arquivo(pagina[0], "BCB/ODATA", validade_paginas_fechadas if pagina[1] else None),
+        esquema = esquemas["BCB/ODATA"],
+        sep = ",", decimal = ","
+        )
 
   try:
     print(f"Coletando a série {codigo} ({nome})")
-    resposta = ler_csv(
-        filepath_or_buffer = url,
-        sep = ",", decimal = ",",
-        converters = {"Data": lambda x: pd.to_datetime(x)}
-        )
+    with ThreadPoolExecutor(max_workers = max_paginas_simultaneas) as executor:
+      resposta = list(executor.map(coleta_pagina, paginas))
+    resposta = pd.concat([df for df in resposta if not df.empty] or resposta[-1:])
   except:
     raise Exception(f"Falha na coleta da série {codigo} ({nome})")
   else:
     return resposta.rename(columns = {"Mediana": nome})
 
-# Coleta dados da API do IPEA (IPEADATA)
-def coleta_ipeadata(codigo, nome):
+# Coleta dados da API do IPEA (IPEADATA); as datas são normalizadas para a data
+# local à meia-noite UTC. No modo incremental, pede à API (OData $filter) só as
+# observações desde a última data salva menos a janela de revisão
+def coleta_ipeadata(codigo, nome, freq = None, incremental = coleta_incremental, janela_revisao = janela_revisao_dias):
+
+  url = monta_url_odata(f"http://www.ipeadata.gov.br/api/odata4/ValoresSerie(SERCODIGO='{codigo}')", colunas = "VALDATA,VALVALOR")
+
+  historico = le_historico(nome, freq) if incremental and freq is not None else None
+  if historico is not None:
+    corte = historico.index.max() - timedelta(days = int(janela_revisao))
+    url = monta_url_odata(url, filtro = f"VALDATA ge {corte.strftime('%Y-%m-%d')}T00:00:00-03:00")
 
-  url = f"http://www.ipeadata.gov.br/api/odata4/ValoresSerie(SERCODIGO='{codigo}')"
   try:
     print(f"Coletando a série {codigo} ({nome})")
-    resposta = pd.read_json(url)
+    resposta = pd.DataFrame.from_records(json.loads(baixa_url(url, "IPEADATA"))["value"], columns = ["VALDATA", "VALVALOR"])
   except:
     raise Exception(f"Falha na coleta da série {codigo} ({nome})")
   else:
-    return (
-        pd.DataFrame.from_records(resposta["value"])
-        .rename(columns = {"VALVALOR": nome, "VALDATA": "data"})
+    df = (
+        aplica_esquema(resposta, esquemas["IPEADATA"])
+        .rename(columns = {"valor": nome})
         .filter(["data", nome])
+        .assign(data = lambda x: x.data.dt.tz_convert("America/Sao_Paulo").dt.tz_localize(None).dt.normalize().dt.tz_localize("UTC"))
+      )
+    if historico is not None:
+      df = mescla_historico(
+          historico.tz_localize("UTC"),
+          df.set_index("data"),
+          pd.Timestamp(corte, tz = "UTC")
+          ).reset_index()
+    return df
+
+# Separa uma URL da API do SIDRA no prefixo (até /values) e nos pares
+# parâmetro/valor (t, n1, v, p, c..., d); retorna None se não seguir o padrão
+def divide_url_sidra(url):
+  prefixo, separador, caminho = str(url).partition("/values/")
+  segmentos = caminho.strip("/").split("/")
+  if not separador or len(segmentos) % 2 != 0:
+    return None
+  return prefixo + "/values", list(zip(segmentos[0::2], segmentos[1::2]))
+
+# Monta uma URL do SIDRA a partir do prefixo e dos pares parâmetro/valor
+def junta_url_sidra(prefixo, pares):
+  return prefixo + "".join(f"/{chave}/{valor}" for chave, valor in pares)
+
+# Coluna da resposta do SIDRA que identifica cada parâmetro da URL: D1C para
+# unidades territoriais (n1, n3, n6...), D2C para variáveis (v) e D4C, D5C...
+# para as classificações (c...), na ordem da URL
+def coluna_dimensao_sidra(pares, chave):
+  if chave.startswith("n"):
+    return "D1C"
+  if chave == "v":
+    return "D2C"
+  classificacoes = [c for c, _ in pares if c.startswith("c")]
+  return f"D{4 + classificacoes.index(chave)}C"
+
+# Agrupa as linhas de metadados do IBGE/SIDRA que diferem apenas na unidade
+# territorial (ex.: municípios em n6), na variável (v, junto com as casas decimais
+# em d) ou em uma única classificação, para que cada grupo (de até max_por_lote
+# séries) seja coletado em uma só requisição e separado depois pela coluna da
+# dimensão; linhas com URLs idênticas entram uma só vez na requisição (do lote
+# ou avulsa). Retorna tarefas
+# de coleta_ibge_sidra_lote
+def monta_tarefas_sidra(df, max_por_lote = max_series_por_lote_sidra):
+
+  # Linhas com a mesma URL (e frequência) formam uma só entrada, que pode ser
+  # agrupada com as demais como qualquer outra
+  pendentes = {}
+  for serie in df.index:
+    ser = df.iloc[serie]
+    chave = (ser["Input de Coleta"], le_metadado(ser, "Frequência"))
+    if chave not in pendentes:
+      pendentes[chave] = ([], divide_url_sidra(ser["Input de Coleta"]))
+    pendentes[chave][0].append(ser)
+
+  def agrupa(chaves):
+    grupos = {}
+    for chave, (_, url) in pendentes.items():
+      if url is None:
+        continue
+      prefixo, pares = url
+      dimensao = [v for c, v in pares if c == chaves[0]]
+      if len(dimensao) != 1 or not dimensao[0].isdigit():
+        continue
+      assinatura = (prefixo, chave[1], tuple((c, v if c not in chaves else None) for c, v in pares))
+      grupos.setdefault(assinatura, []).append(chave)
+    return [g[i:(i + max_por_lote)] for g in grupos.values() for i in range(0, len(g), max_por_lote) if len(g) > 1]
+
+  lotes = []
+  chaves_url = {c for _, url in pendentes.values() if url is not None for c, _ in url[1]}
+  candidatos = (
+      sorted((c,) for c in chaves_url if c.startswith("n"))
+      + [("v", "d")]
+      + sorted((c,) for c in chaves_url if c.startswith("c"))
       )
+  for chaves in candidatos:
+    for grupo in agrupa(chaves):
+      if len(grupo) == 1:
+        continue
+      prefixo, pares = pendentes[grupo[0]][1]
+      dimensao = chaves[0]
+      combinados = []
+      for chave, valor in pares:
+        if chave in chaves:
+          valor = ",".join(dict.fromkeys(dict(pendentes[entrada][1][1])[chave] for entrada in grupo))
+        combinados.append((chave, valor))
+      lotes.append((
+          junta_url_sidra(prefixo, combinados),
+          [ser for entrada in grupo for ser in pendentes[entrada][0]],
+          coluna_dimensao_sidra(pares, dimensao),
+          [dict(pendentes[entrada][1][1])[dimensao] for entrada in grupo for _ in pendentes[entrada][0]]
+          ))
+      for entrada in grupo:
+        del pendentes[entrada]
+
+  lotes.extend((chave[0], series, None, [None] * len(series)) for chave, (series, _) in pendentes.items())
+
+  return [
+      {
+          "funcao": coleta_ibge_sidra_lote,
+          "argumentos": {
+              "codigo": url,
+              "nomes": [ser["Identificador"] for ser in series],
+              "coluna": coluna,
+              "valores": valores,
+              "freq": le_metadado(series[0], "Frequência")
+              },
+          "host": extrai_host(url)
+          }
+      for url, series, coluna, valores in lotes
+      ]
 
-# Coleta dados da API do IBGE (SIDRA)
-def coleta_ibge_sidra(codigo, nome):
+# Converte as datas do histórico nos códigos de período do SIDRA (AAAAMM para
+# meses, AAAA0T para trimestres e AAAA para anos)
+def codigo_periodo_sidra(datas, freq):
+  if freq == "Trimestral":
+    return pd.Index([f"{d.year}0{d.quarter}" for d in datas], name = "data")
+  if freq == "Anual":
+    return pd.Index(datas.strftime("%Y"), name = "data")
+  return pd.Index(datas.strftime("%Y%m"), name = "data")
+
+# Coleta dados da API do IBGE (SIDRA) de uma ou mais séries da mesma tabela em
+# uma só requisição, separando o resultado pela coluna da dimensão (coluna) que
+# identifica cada série (valores). No modo incremental, troca o período completo
+# (/p/all) pelos últimos N períodos desde a última data salva menos a janela de
+# revisão; retorna um dicionário nome -> DataFrame
+def coleta_ibge_sidra_lote(codigo, nomes, coluna = None, valores = [None], freq = None, incremental = coleta_incremental, janela_revisao = janela_revisao_dias):
+
+  historicos = {nome: le_historico(nome, freq) for nome in nomes} if incremental and freq is not None and "/p/all" in codigo else {}
+  incremental = len(historicos) > 0 and all(h is not None for h in historicos.values())
+
+  url = codigo
+  if incremental:
+    frequencia = {"Trimestral": "Q", "Anual": "Y"}.get(freq, "M")
+    corte = min(h.index.max() for h in historicos.values()) - timedelta(days = int(janela_revisao))
+    periodos = (pd.Period(data_hoje, frequencia) - pd.Period(corte, frequencia)).n + 1
+    url = codigo.replace("/p/all", f"/p/last%20{periodos}")
+    corte = codigo_periodo_sidra(pd.DatetimeIndex([pd.Period(corte, frequencia).start_time]), freq)[0]
 
-  url = f"{codigo}?formato=json"
   try:
-    print(f"Coletando a série {codigo} ({nome})")
-    resposta = pd.read_json(url)
+    print(f"Coletando a série {codigo} ({', '.join(nomes)})")
+    resposta = pd.DataFrame.from_records(json.loads(baixa_url(f"{url}?formato=json", "IBGE/SIDRA")))
   except:
-    raise Exception(f"Falha na coleta da série {codigo} ({nome})")
+    raise Exception(f"Falha na coleta da série {codigo} ({', '.join(nomes)})")
   else:
-    df = (
-        resposta
-        .rename(columns = {"D3C": "data", "V": nome})
-        .filter(["data", nome])
-      )
-    df = df[-df[nome].isin(["Valor", "...", "-"])]
-    df[nome] = pd.to_numeric(df[nome])
-    return df
+    resposta = aplica_esquema(resposta, esquemas["IBGE/SIDRA"])
+    resultado = {}
+    for nome, valor in zip(nomes, valores):
+      df = (
+          (resposta if coluna is None else resposta[resposta[coluna] == valor])
+          .rename(columns = {"valor": nome})
+          .filter(["data", nome])
+          .reset_index(drop = True)
+        )
+      if incremental:
+        historico = historicos[nome].set_axis(codigo_periodo_sidra(historicos[nome].index, freq))
+        df = mescla_historico(historico, df.set_index("data"), corte).reset_index()
+      resultado[nome] = df
+    return resultado
+
+# Coleta dados da API do IBGE (SIDRA) de uma série
+def coleta_ibge_sidra(codigo, nome, freq = None, incremental = coleta_incremental, janela_revisao = janela_revisao_dias):
+  return coleta_ibge_sidra_lote(codigo, [nome], freq = freq, incremental = incremental, janela_revisao = janela_revisao)[nome]
 
 # Coleta dados da API do FRED
 def coleta_fred(codigo, nome):
@@ -99,33 +754,42 @@ def coleta_fred(codigo, nome):
 
   try:
     print(f"Coletando a série {codigo} ({nome})")
-    resposta = ler_csv(
-        filepath_or_buffer = url,
-        converters = {"DATE": lambda x: pd.to_datetime(x)}
+    resposta = aplica_esquema(
+        ler_csv(filepath_or_buffer = url, fonte = "FRED", **opcoes_leitura(esquemas["FRED"])),
+        esquemas["FRED"]
         )
   except:
     raise Exception(f"Falha na coleta da série {codigo} ({nome})")
   else:
     return resposta.rename(columns = {"DATE": "data", codigo: nome})
 
-# Coleta dados via link da IFI
-def coleta_ifi(codigo, nome):
+# Coleta dados via link da IFI; a aba convertida fica no cache, identificada pelo
+# hash do conteúdo da planilha, e só é lida de novo quando o arquivo muda
+def coleta_ifi(codigo, nome, aba = "Hiato do Produto"):
 
   try:
     print(f"Coletando a série {codigo} ({nome})")
-    resposta = pd.read_excel(
-        io = codigo,
-        sheet_name = "Hiato do Produto",
-        names = ["data", "lim_inf", nome, "lim_sup"],
-        skiprows = 2
-        )
+    arquivo = baixa_arquivo(codigo, "IFI")
+    convertida = os.path.join(pasta_cache, "planilhas", f"{os.path.basename(arquivo)}_{hashlib.sha256(f'{aba}|{nome}'.encode()).hexdigest()[:16]}.pkl")
+    if os.path.exists(convertida):
+      resposta = pd.read_pickle(convertida)
+    else:
+      resposta = pd.read_excel(
+          io = arquivo,
+          sheet_name = aba,
+          names = ["data", "lim_inf", nome, "lim_sup"],
+          skiprows = 2
+          )
+      os.makedirs(os.path.dirname(convertida), exist_ok = True)
+      resposta.to_pickle(f"{convertida}.tmp")
+      os.replace(f"{convertida}.tmp", convertida)
   except:
     raise Exception(f"Falha na coleta da série {codigo} ({nome})")
   else:
     return resposta
 
-# Separa intervalo de datas em janelas de 10 anos para coleta de dados em blocos
-# na API do BCB/SGS
+# Separa intervalo de datas em janelas de 5 anos (padrão) para coleta de dados em
+# blocos na API do BCB/SGS; janelas consecutivas não se sobrepõem
 def split_date_range(start_date_str, end_date_str, interval_years=5):
   start_date = datetime.strptime(start_date_str, "%d/%m/%Y")
   end_date = datetime.strptime(end_date_str, "%d/%m/%Y")
@@ -133,12 +797,13 @@ def split_date_range(start_date_str, end_date_str, interval_years=5):
   result = []
   current_start = start_date
 
-  while current_start < end_date:
+  while current_start <= end_date:
     try:
-      current_end = current_start.replace(year=current_start.year + interval_years)
+      next_start = current_start.replace(year=current_start.year + interval_years)
     except ValueError:
-      current_end = current_start + timedelta(days=365 * interval_years)
+      next_start = current_start + timedelta(days=365 * interval_years)
 
+    current_end = next_start - timedelta(days=1)
     if current_end > end_date:
       current_end = end_date
 
@@ -146,6 +811,570 @@ def split_date_range(start_date_str, end_date_str, interval_years=5):
       current_start.strftime("%d/%m/%Y"),
       current_end.strftime("%d/%m/%Y")
     ))
-    current_start = current_end
+    current_start = next_start
 
   return result
+
+# Extrai o host de uma URL para limitar coletas simultâneas por servidor
+def extrai_host(url):
+  return urlparse(str(url)).netloc
+
+# Lê uma coluna opcional dos metadados, retornando o padrão se ausente ou vazia
+def le_metadado(ser, coluna, padrao = None):
+  if coluna not in ser.index or pd.isna(ser[coluna]):
+    return padrao
+  return ser[coluna]
+
+# Monta tarefas de coleta a partir das linhas de metadados de uma fonte; colunas
+# mapeia argumentos adicionais da função de coleta para colunas dos metadados
+def monta_tarefas(df, funcao, host = None, colunas = {}):
+  tarefas = []
+  for serie in df.index:
+    ser = df.iloc[serie]
+    argumentos = {"codigo": ser["Input de Coleta"], "nome": ser["Identificador"]}
+    for argumento, coluna in colunas.items():
+      valor = le_metadado(ser, coluna)
+      if valor is not None:
+        argumentos[argumento] = valor
+    tarefas.append({
+        "funcao": funcao,
+        "argumentos": argumentos,
+        "host": host if host is not None else extrai_host(ser["Input de Coleta"])
+        })
+  return tarefas
+
+# Caminho do arquivo de uma série na zona bruta
+def caminho_bruto(fonte, nome):
+  return os.path.join(pasta_bruto, fonte.replace("/", "_"), f"{nome}.parquet")
+
+trava_manifesto = threading.Lock()
+
+# Assinatura de uma tarefa de coleta: hash da função, dos argumentos (código ou
+# URL, frequência, filtros etc.) e dos modos de coleta (incremental, offline,
+# gravação e replay), para que a zona bruta só seja reaproveitada pela mesma coleta
+def assinatura_tarefa(tarefa):
+  return hashlib.sha256(json.dumps({
+      "funcao": tarefa["funcao"].__name__,
+      "argumentos": tarefa["argumentos"],
+      "modos": [coleta_incremental, modo_offline, modo_gravacao, modo_replay]
+      }, sort_keys = True, default = str).encode()).hexdigest()
+
+# Lê o manifesto da zona bruta (fonte -> série -> arquivo, data de coleta, linhas
+# e assinatura da tarefa)
+def le_manifesto_bruto():
+  if not os.path.exists(arquivo_manifesto_bruto):
+    return {}
+  with open(arquivo_manifesto_bruto) as arquivo:
+    return json.load(arquivo)
+
+# Grava uma série coletada na zona bruta e a registra no manifesto
+def grava_bruto(fonte, nome, df, assinatura = None):
+  caminho = caminho_bruto(fonte, nome)
+  os.makedirs(os.path.dirname(caminho), exist_ok = True)
+  df.to_parquet(f"{caminho}.tmp")
+  os.replace(f"{caminho}.tmp", caminho)
+  with trava_manifesto:
+    manifesto = le_manifesto_bruto()
+    manifesto.setdefault(fonte, {})[nome] = {
+        "arquivo": caminho,
+        "coletado_em": time.time(),
+        "linhas": len(df),
+        "assinatura": assinatura
+        }
+    grava_atomico(arquivo_manifesto_bruto, json.dumps(manifesto, indent = 2).encode())
+
+# Verifica se a série está na zona bruta, foi coletada há menos de validade
+# segundos e pela mesma tarefa (assinatura), sem mudanças nos metadados ou modos
+def bruto_atualizado(fonte, nome, assinatura = None, validade = validade_bruto):
+  with trava_manifesto:
+    entrada = le_manifesto_bruto().get(fonte, {}).get(nome)
+  return (
+      entrada is not None
+      and entrada.get("assinatura") == assinatura
+      and os.path.exists(entrada["arquivo"])
+      and time.time() - entrada["coletado_em"] < validade
+      )
+
+# Lê uma série da zona bruta
+def le_bruto(fonte, nome):
+  return pd.read_parquet(caminho_bruto(fonte, nome))
+
+# Executa as tarefas de coleta de todas as fontes de forma concorrente, com
+# limite de coletas simultâneas por host. Cada série é gravada na zona bruta assim
+# que coletada (nada fica em memória) e séries ainda atualizadas lá não são
+# coletadas de novo (exceto no replay, que sempre usa as fixtures), de modo que
+# uma nova execução após falhas retoma apenas as que faltam. Devolve, por fonte, os nomes das séries de cada tarefa, na ordem;
+# falhas são reunidas e levantadas ao final, depois de concluídas as demais tarefas
+def executa_coletas(tarefas, max_workers = max_coletas_simultaneas, max_por_host = max_coletas_por_host):
+
+  semaforos = {
+      t["host"]: threading.Semaphore(max_por_host)
+      for lista in tarefas.values() for t in lista
+      }
+
+  def executa(fonte, tarefa):
+    nomes = tarefa["argumentos"].get("nomes") or [tarefa["argumentos"]["nome"]]
+    assinatura = assinatura_tarefa(tarefa)
+    if not modo_replay and all(bruto_atualizado(fonte, nome, assinatura) for nome in nomes):
+      print(f"Série(s) {', '.join(nomes)} já coletada(s); reaproveitando a zona bruta")
+      return nomes
+    with semaforos[tarefa["host"]]:
+      resultado = tarefa["funcao"](**tarefa["argumentos"])
+    for nome, df in (resultado if isinstance(resultado, dict) else {nomes[0]: resultado}).items():
+      grava_bruto(fonte, nome, df, assinatura)
+    return nomes
+
+  with ThreadPoolExecutor(max_workers = max_workers) as executor:
+    futuros = {
+        fonte: [executor.submit(executa, fonte, t) for t in lista]
+        for fonte, lista in tarefas.items()
+        }
+    resultados, falhas = {}, []
+    for fonte, lista in futuros.items():
+      resultados[fonte] = []
+      for f in lista:
+        try:
+          resultados[fonte].append(f.result())
+        except Exception as e:
+          falhas.append(str(e))
+
+  if falhas:
+    raise Exception(f"{len(falhas)} coleta(s) falharam; execute de novo para retomar apenas as que faltam:\n" + "\n".join(falhas))
+  return resultados
+
+# Lê (uma vez por versão do arquivo) uma base de dados já disponibilizada em dados/
+@functools.lru_cache(maxsize = None)
+def le_base_salva(arquivo, modificado_em):
+  return pd.read_parquet(arquivo)
+
+# Lê do histórico salvo a série de uma frequência, sem observações vazias ou
+# datas repetidas; retorna None se não houver histórico para a série
+def le_historico(nome, freq):
+  arquivo = arquivos_historico.get(freq)
+  if arquivo is None or not os.path.exists(arquivo):
+    return None
+  df = le_base_salva(arquivo, os.path.getmtime(arquivo))
+  if nome not in df.columns or df[nome].dropna().empty:
+    return None
+  df = df[[nome]].dropna().rename_axis("data", axis = "index")
+  return df[~df.index.duplicated(keep = "last")]
+
+# Mescla dados novos ao histórico: observações a partir da data de corte são
+# substituídas pelas recém coletadas, capturando revisões. As coletadas antes do
+# corte são descartadas (ex.: /p/last N do SIDRA conta a partir do último período
+# publicado, não de hoje), para que nenhuma data fique repetida
+def mescla_historico(historico, novo, corte):
+  return pd.concat([historico[historico.index < corte], novo[novo.index >= corte]])
+
+# Converte DataReferencia do Focus em data conforme o formato ("T/%Y" para
+# trimestres no formato 1/2024)
+def converte_referencia_focus(referencia, formato):
+  if formato == "T/%Y":
+    return pd.PeriodIndex(
+        referencia.str.replace(r"(\d{1})/(\d{4})", r"\2-Q\1", regex = True),
+        freq = "Q"
+        ).to_timestamp()
+  return pd.to_datetime(referencia, format = formato)
+
+# Representação compacta de uma série bruta do Focus: Data em dias desde
+# 1970-01-01 e DataReferencia em meses desde 1970-01 (int32), horizonte já
+# calculado como (DataReferencia - Data) em unidades de dias da especificação,
+# truncado (int32), Indicador como categoria e, dos valores, só a mediana (nome)
+def compacta_focus(df, nome, especificacao = None):
+  datas = df["Data"].to_numpy(dtype = "datetime64[ns]").astype("datetime64[D]")
+  compacto = {"Data": datas.astype(np.int32)}
+  if "Indicador" in df.columns:
+    compacto["Indicador"] = pd.Categorical(df["Indicador"])
+  if especificacao is not None and especificacao["referencia"] is not None:
+    referencia = np.asarray(converte_referencia_focus(df["DataReferencia"], especificacao["referencia"]), dtype = "datetime64[ns]").astype("datetime64[D]")
+    compacto["DataReferencia"] = referencia.astype("datetime64[M]").astype(np.int32)
+    with np.errstate(invalid = "ignore"):
+      horizonte = np.trunc((referencia - datas).astype(np.int64) / especificacao["unidade"])
+    compacto["horizonte"] = np.where(np.isnat(referencia), np.iinfo(np.int32).min, horizonte).astype(np.int32)
+  compacto[nome] = df[nome].to_numpy(dtype = float)
+  return pd.DataFrame(compacto)
+
+# Agrega as expectativas do Focus em uma só passada: das séries brutas compactas
+# (dicionário nome -> DataFrame de compacta_focus), mantém o horizonte desejado
+# comparando inteiros, empilha tudo e tira a média por indicador e período (mês
+# ou trimestre de Data) em um único groupby. Retorna um dicionário nome ->
+# DataFrame com as colunas data e nome
+def agrega_expectativas(dfs, especificacoes = expectativas_focus):
+
+  partes = []
+  for nome, e in especificacoes.items():
+    df = dfs[nome]
+    manter = np.ones(len(df), dtype = bool) if e["horizonte"] is None else df["horizonte"].to_numpy() == e["horizonte"]
+    meses = df["Data"].to_numpy()[manter].astype("datetime64[D]").astype("datetime64[M]")
+    if e["freq"] == "Q":
+      meses = meses - meses.astype(int) % 3
+    partes.append(pd.DataFrame({
+        "indicador": nome,
+        "data": meses.astype("datetime64[ns]"),
+        "valor": df[nome].to_numpy()[manter]
+        }))
+
+  medias = (
+      pd.concat(partes, ignore_index = True)
+      .astype({"indicador": pd.CategoricalDtype(list(especificacoes))})
+      .groupby(["indicador", "data"], observed = True)["valor"]
+      .mean()
+      .reset_index()
+      )
+  return {
+      nome: medias.loc[medias["indicador"] == nome, ["data", "valor"]].rename(columns = {"valor": nome}).reset_index(drop = True)
+      for nome in especificacoes
+      }
+
+# Data de corte do tratamento incremental: 1º de janeiro do ano que contém a
+# data mais antiga revisada pela coleta incremental (hoje menos a janela de
+# revisão), de modo que meses, trimestres e anos a partir dela sejam recalculados
+# inteiros. Retorna None (tratamento completo) se alguma base salva não existir
+# ou tiver datas repetidas, casos em que a atualização não seria exata
+def calcula_corte_tratamento(janela_revisao = janela_revisao_dias):
+  for arquivo in arquivos_historico.values():
+    if not os.path.exists(arquivo):
+      return None
+    if not le_base_salva(arquivo, os.path.getmtime(arquivo)).index.is_unique:
+      print(f"{arquivo} tem datas repetidas; tratamento completo")
+      return None
+  return pd.Timestamp((data_hoje - timedelta(days = int(janela_revisao))).year, 1, 1)
+
+# Colunas (séries) presentes nas bases salvas
+def colunas_base_salva():
+  return {
+      coluna
+      for arquivo in arquivos_historico.values() if os.path.exists(arquivo)
+      for coluna in le_base_salva(arquivo, os.path.getmtime(arquivo)).columns
+      }
+
+# Mantém de uma série bruta só as observações a partir do corte, se alguma de
+# suas colunas já estiver na base salva (séries novas são tratadas inteiras). A
+# data fica no índice ou nas colunas data/Data/observation_date; códigos de
+# período do SIDRA são comparados pelo ano e dias do Focus (compacta_focus), pelo
+# dia
+def recorta_bruto(df, corte, colunas_salvas):
+  if not any(coluna in colunas_salvas for coluna in df.columns):
+    return df
+  if isinstance(df.index, pd.DatetimeIndex):
+    return df[df.index >= corte]
+  for coluna in ["data", "Data", "observation_date"]:
+    if coluna in df.columns:
+      datas = df[coluna]
+      if pd.api.types.is_datetime64_any_dtype(datas):
+        return df[datas >= (corte.tz_localize(datas.dt.tz) if datas.dt.tz is not None else corte)]
+      if pd.api.types.is_integer_dtype(datas):
+        return df[datas >= (corte - pd.Timestamp("1970-01-01")).days]
+      return df[datas.astype(str).str[:4].astype(int) >= corte.year]
+  return df
+
+# Atualiza uma base salva com os períodos recalculados a partir do corte: antes
+# do corte ficam as linhas salvas (e, para séries novas, as recalculadas); as
+# colunas seguem a ordem do recálculo, sem as séries que deixaram de existir
+def atualiza_base(arquivo, novo, corte):
+  salvo = pd.read_parquet(arquivo)
+  anterior = salvo[salvo.index < corte]
+  novas = [coluna for coluna in novo.columns if coluna not in salvo.columns]
+  if novas:
+    anterior = anterior.join(other = novo.loc[novo.index < corte, novas], how = "outer")
+  anterior = anterior.reindex(columns = novo.columns)
+  if any(coluna not in novo.columns for coluna in salvo.columns):
+    anterior = anterior.dropna(how = "all")
+  return pd.concat([anterior, novo[novo.index >= corte]])
+
+# Regras de conversão de frequência por série: coluna Agregação dos metadados
+# (mean, first, last, sum ou ffill), com regras_agregacao_padrao para as demais
+def regras_agregacao(df_metadados = None):
+  if df_metadados is None:
+    df_metadados = carrega_metadados()
+  regras = dict(regras_agregacao_padrao)
+  if "Agregação" in df_metadados.columns:
+    regras.update(df_metadados.set_index("Identificador")["Agregação"].dropna().str.strip().str.lower().to_dict())
+  return regras
+
+# Soma compensada (Kahan) dos valores não vazios de cada segmento [inicio, fim)
+# das linhas, coluna a coluna, na mesma ordem e com o mesmo algoritmo do groupby
+# do pandas (resultados idênticos bit a bit); retorna somas e contagens
+def soma_segmentos(valores, inicio, fim):
+  soma = np.zeros((len(inicio), valores.shape[1]))
+  compensacao = np.zeros_like(soma)
+  contagem = np.zeros(soma.shape, dtype = np.int64)
+  tamanho = fim - inicio
+  for k in range(tamanho.max(initial = 0)):
+    ativos = np.flatnonzero(tamanho > k)
+    valor = valores[inicio[ativos] + k]
+    valido = ~np.isnan(valor)
+    y = valor - compensacao[ativos]
+    t = soma[ativos] + y
+    nova_compensacao = t - soma[ativos] - y
+    nova_compensacao[np.isnan(nova_compensacao)] = 0
+    soma[ativos] = np.where(valido, t, soma[ativos])
+    compensacao[ativos] = np.where(valido, nova_compensacao, compensacao[ativos])
+    contagem[ativos] += valido
+  return soma, contagem
+
+# Converte a frequência (M, Q ou Y) de todas as colunas de um DataFrame indexado
+# por datas em uma só passada: as datas viram códigos inteiros de período,
+# ordenados, e cada coluna é reduzida por segmentos de mesmo código conforme sua
+# regra (regras: coluna -> regra; demais colunas: regra_padrao):
+#   mean  - média das observações do período (como resample().mean())
+#   sum   - soma das observações do período (0 se não houver)
+#   first - primeira linha do período, mesmo vazia (como groupby().head(1))
+#   last  - última linha do período, mesmo vazia (como asfreq() ao aumentar a
+#           frequência)
+#   ffill - última linha do período, preenchendo os períodos sem dados com o
+#           valor anterior (como asfreq().ffill())
+# Retorna o DataFrame indexado pelo início de cada período, do primeiro ao último
+def converte_frequencia(df, freq, regras = {}, regra_padrao = "mean"):
+
+  datas = pd.DatetimeIndex(df.index)
+  meses = datas.year.to_numpy(dtype = np.int64) * 12 + datas.month.to_numpy(dtype = np.int64) - 1
+  meses_por_periodo = {"M": 1, "Q": 3, "Y": 12}[freq]
+  codigos = meses // meses_por_periodo
+  valores = df.to_numpy(dtype = float)
+  if len(codigos) > 1 and np.any(codigos[1:] < codigos[:-1]):
+    ordem = np.argsort(codigos, kind = "stable")
+    codigos, valores = codigos[ordem], valores[ordem]
+
+  inicio = np.flatnonzero(np.r_[True, codigos[1:] != codigos[:-1]]) if len(codigos) else np.array([], dtype = np.int64)
+  fim = np.r_[inicio[1:], len(codigos)].astype(np.int64)
+  presentes = codigos[inicio]
+  periodos = np.arange(presentes[0], presentes[-1] + 1) if len(presentes) else presentes
+  posicao = presentes - (presentes[0] if len(presentes) else 0)
+
+  saida = np.full((len(periodos), valores.shape[1]), np.nan)
+  regra_coluna = np.array([regras.get(coluna, regra_padrao) for coluna in df.columns], dtype = object)
+  for regra in dict.fromkeys(regra_coluna):
+    colunas = np.flatnonzero(regra_coluna == regra)
+    bloco = valores[:, colunas]
+    if regra in ("mean", "sum"):
+      soma, contagem = soma_segmentos(bloco, inicio, fim)
+      if regra == "mean":
+        with np.errstate(invalid = "ignore", divide = "ignore"):
+          resultado = np.where(contagem > 0, soma / np.maximum(contagem, 1), np.nan)
+      else:
+        saida[:, colunas] = 0
+        resultado = soma
+    elif regra == "first":
+      resultado = bloco[inicio]
+    elif regra in ("last", "ffill"):
+      resultado = bloco[fim - 1]
+    else:
+      raise ValueError(f"Regra de agregação inválida: {regra}")
+    saida[np.ix_(posicao, colunas)] = resultado
+    if regra == "ffill":
+      parte = saida[:, colunas]
+      ultima = np.where(~np.isnan(parte), np.arange(len(parte))[:, None], 0)
+      np.maximum.accumulate(ultima, axis = 0, out = ultima)
+      saida[:, colunas] = np.take_along_axis(parte, ultima, axis = 0)
+
+  meses = periodos * meses_por_periodo
+  indice = pd.DatetimeIndex(
+      pd.to_datetime({"year": meses // 12, "month": meses % 12 + 1, "day": 1}),
+      freq = {"M": "MS", "Q": "QS", "Y": "YS"}[freq] if len(meses) else None,
+      name = df.index.name
+      )
+  return pd.DataFrame(saida, index = indice, columns = df.columns)
+
+# Séries declaradas com precisão simples (float32) na coluna Precisão dos
+# metadados, usadas pelo modo compacto
+def series_precisao_simples(df_metadados = None):
+  if df_metadados is None:
+    df_metadados = carrega_metadados()
+  if "Precisão" not in df_metadados.columns:
+    return []
+  precisao = df_metadados["Precisão"].astype(str).str.strip().str.lower()
+  return df_metadados.loc[precisao.isin(["float32", "simples"]), "Identificador"].to_list()
+
+# Modo compacto: converte para float32 as colunas declaradas em simples, para
+# categorias as colunas de texto com poucos valores distintos e, se esparsa, para
+# esparsas as colunas numéricas com ao menos limite_esparso de ausentes (só em
+# memória: o Parquet não grava colunas esparsas); informa a memória economizada.
+# Fora do modo compacto, retorna a tabela sem alterações
+def compacta_base(df, nome, simples = (), esparsa = False):
+  if not modo_compacto:
+    return df
+
+  antes = df.memory_usage(deep = True).sum()
+  tipos = {}
+  for coluna in df.columns:
+    serie = df[coluna]
+    if coluna in simples and pd.api.types.is_float_dtype(serie.dtype):
+      tipos[coluna] = "float32"
+    elif serie.dtype == object and serie.nunique() <= len(serie) // 2:
+      tipos[coluna] = "category"
+  df = df.astype(tipos) if tipos else df
+  if esparsa and len(df) > 0:
+    ausentes = df.select_dtypes("number").isna().mean()
+    esparsas = ausentes.index[ausentes >= limite_esparso]
+    if len(esparsas) > 0:
+      df = df.astype({coluna: pd.SparseDtype(df[coluna].dtype, np.nan) for coluna in esparsas})
+
+  depois = df.memory_usage(deep = True).sum()
+  print(f"{nome}: {antes / 2**20:.2f} MB -> {depois / 2**20:.2f} MB em memória ({1 - depois / max(antes, 1):.0%} a menos)")
+  return df
+
+# Lê uma base disponibilizada; no modo compacto, mantém esparsas em memória as
+# colunas quase vazias (ver compacta_base)
+def le_base(arquivo):
+  return compacta_base(pd.read_parquet(arquivo), arquivo, esparsa = True)
+
+# Monta uma base disponibilizada: cruza as séries (ignorando grupos sem séries,
+# como frequências sem nenhuma série de uma fonte), mantém os dados a
+# partir de 2000 e, no tratamento incremental, atualiza a base salva. Recusa
+# (erro) bases com datas repetidas, em vez de gravá-las
+def monta_base(dfs, arquivo, corte = None):
+  df = junta_series(df for df in dfs if len(df.columns) > 0)
+  df = (
+      df
+      .set_index(pd.to_datetime(df.index))
+      .query("index >= '2000-01-01'")
+      .astype(float)
+      )
+  if corte is not None:
+    df = atualiza_base(arquivo, df, corte)
+  if not df.index.is_unique:
+    repetidas = df.index[df.index.duplicated()].unique()
+    raise ValueError(f"{arquivo} não foi gravada: datas repetidas ({', '.join(map(str, repetidas[:5]))}{'...' if len(repetidas) > 5 else ''}); verifique as séries brutas")
+  return df
+
+# Cruza (outer join) várias séries de uma vez: une os índices em uma só passada
+# e aloca a tabela de saída uma única vez, em vez de juntar uma série por vez ao
+# resultado acumulado. O resultado é igual ao de joins sucessivos (índice ordenado
+# e colunas na ordem das séries); se algum índice tiver datas repetidas, recorre
+# aos joins sucessivos, que nesse caso combinam as repetições
+def junta_series(dfs):
+
+  dfs = list(dfs)
+  if not dfs:
+    return pd.DataFrame(index = pd.DatetimeIndex([], name = "data"), dtype = float)
+  colunas = [c for df in dfs for c in df.columns]
+  if len(set(colunas)) < len(colunas):
+    raise ValueError(f"Colunas repetidas ao cruzar séries: {sorted({c for c in colunas if colunas.count(c) > 1})}")
+  if len(dfs) == 1:
+    return dfs[0]
+
+  if not all(df.index.is_unique for df in dfs):
+    resultado = dfs[0]
+    for df in dfs[1:]:
+      resultado = resultado.join(other = df, how = "outer")
+    return resultado
+
+  indice = dfs[0].index.append([df.index for df in dfs[1:]]).unique()
+  try:
+    indice = indice.sort_values()
+  except TypeError:
+    pass
+  indice.name = dfs[0].index.name
+
+  if all(tipo == np.float64 for df in dfs for tipo in df.dtypes):
+    matriz = np.full((len(indice), len(colunas)), np.nan)
+    inicio = 0
+    for df in dfs:
+      matriz[indice.get_indexer(df.index), inicio:(inicio + df.shape[1])] = df.to_numpy()
+      inicio += df.shape[1]
+    return pd.DataFrame(matriz, index = indice, columns = colunas)
+
+  return pd.concat([df.reindex(indice) for df in dfs], axis = "columns")
+
+# Carrega os metadados do retrato local, indexados pelo Identificador (que também
+# é mantido como coluna). Com atualizar = True, usado uma vez por execução em
+# 03-coleta.py, baixa a planilha e só a converte de novo se o conteúdo mudou
+def carrega_metadados(atualizar = False):
+
+  versao = None
+  if os.path.exists(arquivo_versao_metadados) and os.path.exists(arquivo_metadados):
+    with open(arquivo_versao_metadados) as arquivo:
+      versao = json.load(arquivo)
+
+  if atualizar or versao is None:
+    conteudo = baixa_url(url_metadados, "Metadados")
+    hash_planilha = hashlib.sha256(conteudo).hexdigest()
+    if versao is None or versao["hash"] != hash_planilha:
+      print("Atualizando retrato local dos metadados")
+      df = pd.read_excel(io = BytesIO(conteudo), sheet_name = "Metadados", dtype = str)
+      os.makedirs(os.path.dirname(arquivo_metadados), exist_ok = True)
+      df.to_parquet(f"{arquivo_metadados}.tmp", index = False)
+      os.replace(f"{arquivo_metadados}.tmp", arquivo_metadados)
+      grava_atomico(arquivo_versao_metadados, json.dumps({
+          "hash": hash_planilha,
+          "atualizado_em": datetime.now().isoformat(timespec = "seconds")
+          }, indent = 2).encode())
+
+  return pd.read_parquet(arquivo_metadados).set_index("Identificador", drop = False)
+
+
+# Pede à IA (Gemini) as previsões descritas no prompt, enviando o arquivo CSV com
+# os dados, e retorna o texto da resposta; no modo de gravação a resposta é salva
+# como fixture (uma por arquivo enviado) e no modo replay é lida dela
+def gera_previsao_ia(prompt, arquivo, modelo = "gemini-1.5-pro"):
+
+  fixture = caminho_fixture(f"ia:{os.path.basename(arquivo)}", ".txt")
+  if modo_replay:
+    if not os.path.exists(fixture):
+      raise Exception(f"Modo replay: previsão da IA para {arquivo} não tem fixture gravada em {pasta_fixtures}")
+    with open(fixture, encoding = "utf-8") as texto:
+      return texto.read()
+
+  genai.configure(api_key = os.environ["GEMINI_API_KEY"])
+  modelo_ia = genai.GenerativeModel(model_name = modelo)
+  texto = modelo_ia.generate_content([prompt, genai.upload_file(arquivo)]).text
+  if modo_gravacao:
+    os.makedirs(pasta_fixtures, exist_ok = True)
+    grava_atomico(fixture, texto.encode("utf-8"))
+  return texto
+
+# Sonda as fontes pedindo só a observação mais recente de cada série (SGS
+# ultimos/1, último período do SIDRA, última Data do ODATA e do IPEADATA; FRED e
+# IFI são baixados inteiros) e compara o hash de cada resposta às marcas d'água
+# da base disponibilizada. Retorna True se algo mudou (ou se a sonda falhou); as
+# marcas sondadas ficam no cache e são promovidas em 05-disponibilizacao.py. No
+# GitHub Actions, grava mudou=true/false nas saídas do passo
+def sonda_fontes(df_metadados = None):
+
+  if df_metadados is None:
+    df_metadados = carrega_metadados(atualizar = True)
+
+  urls = {}
+  for _, ser in df_metadados.query("`Forma de Coleta` == 'API' or Fonte == 'IFI'").iterrows():
+    codigo, fonte = ser["Input de Coleta"], ser["Fonte"]
+    if fonte == "BCB/SGS":
+      url = f"https://api.bcb.gov.br/dados/serie/bcdata.sgs.{codigo}/dados/ultimos/1?formato=json"
+    elif fonte == "BCB/ODATA":
+      url = monta_url_odata(codigo, filtro = le_metadado(ser, "Filtro ODATA"), ordem = "Data desc", limite = 1)
+    elif fonte == "IPEADATA":
+      url = monta_url_odata(f"http://www.ipeadata.gov.br/api/odata4/ValoresSerie(SERCODIGO='{codigo}')", colunas = "VALDATA,VALVALOR", ordem = "VALDATA desc", limite = 1)
+    elif fonte == "IBGE/SIDRA":
+      url = f"{codigo.replace('/p/all', '/p/last%201')}?formato=json"
+    elif fonte == "FRED":
+      url = f"https://fred.stlouisfed.org/graph/fredgraph.csv?id={codigo}"
+    else:
+      url = codigo
+    urls[f"{fonte}/{ser['Identificador']}"] = url
+
+  def sonda(url):
+    try:
+      return os.path.basename(baixa_arquivo(url, validade = 0))
+    except Exception as e:
+      print(f"Falha ao sondar {url} ({e})")
+      return None
+
+  with ThreadPoolExecutor(max_workers = max_coletas_simultaneas) as executor:
+    marcas = dict(zip(urls, executor.map(sonda, urls.values())))
+  with open(arquivo_versao_metadados) as arquivo:
+    marcas["Metadados"] = json.load(arquivo)["hash"]
+
+  anteriores = {}
+  if os.path.exists(arquivo_marcas_dagua):
+    with open(arquivo_marcas_dagua) as arquivo:
+      anteriores = json.load(arquivo)
+  mudancas = [chave for chave, marca in marcas.items() if marca is None or anteriores.get(chave) != marca]
+  mudou = len(mudancas) > 0
+
+  os.makedirs(pasta_cache, exist_ok = True)
+  grava_atomico(os.path.join(pasta_cache, "marcas_sondadas.json"), json.dumps(marcas, indent = 2).encode())
+  print(f"Séries com dados novos: {', '.join(mudancas)}" if mudou else "Nenhuma fonte com dados novos")
+  if "GITHUB_OUTPUT" in os.environ:
+    with open(os.environ["GITHUB_OUTPUT"], "a") as saida:
+      saida.write(f"mudou={'true' if mudou else 'false'}\n")
+  return mudou
\ No newline at end of file
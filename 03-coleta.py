@@ -1,106 +1,107 @@
-# Planilha de metadados
-df_metadados = pd.read_excel(
-    io = "https://docs.google.com/spreadsheets/d/1x8Ugm7jVO7XeNoxiaFPTPm1mfVc3JUNvvVqVjCioYmE/export?format=xlsx",
-    sheet_name = "Metadados"
-    )
+# Planilha de metadados (atualiza o retrato local usado também em 06-09)
+df_metadados = carrega_metadados(atualizar = True)
 
 
-# Coleta dados do BCB/SGS
+# Séries do BCB/SGS
 input_bcb_sgs = (
     df_metadados
     .query("Fonte == 'BCB/SGS' and `Forma de Coleta` == 'API'")
     .reset_index(drop = True)
 )
 
-df_bruto_bcb_sgs = {"Diária": [], "Mensal": [], "Trimestral": [], "Anual": []}
-
-for serie in input_bcb_sgs.index:
-  ser = input_bcb_sgs.iloc[serie]
-  df_temp = coleta_bcb_sgs(
-      codigo = ser["Input de Coleta"],
-      nome = ser["Identificador"], 
-      freq = ser["Frequência"]
-      )
-  df_bruto_bcb_sgs[ser["Frequência"]].append(df_temp)
-
-
-# Coleta dados do BCB/ODATA
+# Séries do BCB/ODATA
 input_bcb_odata = (
     df_metadados
     .query("Fonte == 'BCB/ODATA' and `Forma de Coleta` == 'API'")
     .reset_index(drop = True)
 )
 
-df_bruto_bcb_odata = []
-
-for serie in input_bcb_odata.index:
-  ser = input_bcb_odata.iloc[serie]
-  df_temp = coleta_bcb_odata(
-      codigo = ser["Input de Coleta"],
-      nome = ser["Identificador"]
-      )
-  df_bruto_bcb_odata.append(df_temp)
-
-
-# Coleta dados do IPEADATA
+# Séries do IPEADATA
 input_ipeadata = (
     df_metadados
     .query("Fonte == 'IPEADATA' and `Forma de Coleta` == 'API'")
     .reset_index(drop = True)
 )
 
-df_bruto_ipeadata = {"Diária": [], "Mensal": []}
-
-for serie in input_ipeadata.index:
-  ser = input_ipeadata.iloc[serie]
-  df_temp = coleta_ipeadata(
-      codigo = ser["Input de Coleta"],
-      nome = ser["Identificador"]
-      )
-  df_bruto_ipeadata[ser["Frequência"]].append(df_temp)
-
-
-# Coleta dados do IBGE/SIDRA
+# Séries do IBGE/SIDRA
 input_sidra = (
     df_metadados
     .query("Fonte == 'IBGE/SIDRA' and `Forma de Coleta` == 'API'")
     .reset_index(drop = True)
 )
 
-df_bruto_ibge_sidra = {"Mensal": [], "Trimestral": []}
-
-for serie in input_sidra.index:
-  ser = input_sidra.iloc[serie]
-  df_temp = coleta_ibge_sidra(
-      codigo = ser["Input de Coleta"],
-      nome = ser["Identificador"]
-      )
-  df_bruto_ibge_sidra[ser["Frequência"]].append(df_temp)
-
-
-# Coleta dados do FRED
+# Séries do FRED
 input_fred = (
     df_metadados
     .query("Fonte == 'FRED' and `Forma de Coleta` == 'API'")
     .reset_index(drop = True)
 )
 
-df_bruto_fred = {"Diária": [], "Mensal": [], "Trimestral": []}
-
-for serie in input_fred.index:
-  ser = input_fred.iloc[serie]
-  df_temp = coleta_fred(
-      codigo = ser["Input de Coleta"],
-      nome = ser["Identificador"]
-      )
-  df_bruto_fred[ser["Frequência"]].append(df_temp)
-
-
-# Coleta dados do IFI
+# Séries do IFI
 input_ifi = (
     df_metadados
     .query("Fonte == 'IFI'")
     .reset_index(drop = True)
 )
 
-df_bruto_ifi = coleta_ifi(input_ifi["Input de Coleta"][0], input_ifi["Identificador"][0])
+
+# Coleta dados de todas as fontes de forma concorrente, gravando cada série na
+# zona bruta (bruto/) assim que coletada
+df_bruto = executa_coletas({
+    "BCB/SGS": monta_tarefas(
+        input_bcb_sgs, coleta_bcb_sgs, host = "api.bcb.gov.br",
+        colunas = {"freq": "Frequência", "intervalo_anos": "Janela de Coleta"}
+        ),
+    "BCB/ODATA": monta_tarefas(
+        input_bcb_odata, coleta_bcb_odata,
+        colunas = {
+            "filtro": "Filtro ODATA",
+            "colunas": "Colunas ODATA",
+            "data_inicio": "Data Inicial ODATA",
+            "anos_por_pagina": "Paginação ODATA"
+            }
+        ),
+    "IPEADATA": monta_tarefas(input_ipeadata, coleta_ipeadata, host = "www.ipeadata.gov.br", colunas = {"freq": "Frequência"}),
+    "IBGE/SIDRA": monta_tarefas_sidra(input_sidra),
+    "FRED": monta_tarefas(input_fred, coleta_fred, host = "fred.stlouisfed.org"),
+    "IFI": monta_tarefas(input_ifi.head(1), coleta_ifi)
+})
+
+
+# Separa dados do BCB/SGS por frequência
+df_bruto_bcb_sgs = {"Diária": [], "Mensal": [], "Trimestral": [], "Anual": []}
+
+for serie in input_bcb_sgs.index:
+  df_bruto_bcb_sgs[input_bcb_sgs.iloc[serie]["Frequência"]].append(le_bruto("BCB/SGS", input_bcb_sgs.iloc[serie]["Identificador"]))
+
+
+# Dados do BCB/ODATA (por identificador), na representação compacta do Focus
+df_bruto_bcb_odata = {
+    nome: compacta_focus(le_bruto("BCB/ODATA", nome), nome, expectativas_focus.get(nome))
+    for nome in input_bcb_odata["Identificador"]
+    }
+
+
+# Separa dados do IPEADATA por frequência
+df_bruto_ipeadata = {"Diária": [], "Mensal": []}
+
+for serie in input_ipeadata.index:
+  df_bruto_ipeadata[input_ipeadata.iloc[serie]["Frequência"]].append(le_bruto("IPEADATA", input_ipeadata.iloc[serie]["Identificador"]))
+
+
+# Separa dados do IBGE/SIDRA (coletados em lotes por tabela) por frequência
+df_bruto_ibge_sidra = {"Mensal": [], "Trimestral": [], "Anual": []}
+
+for serie in input_sidra.index:
+  df_bruto_ibge_sidra[input_sidra.iloc[serie]["Frequência"]].append(le_bruto("IBGE/SIDRA", input_sidra.iloc[serie]["Identificador"]))
+
+
+# Separa dados do FRED por frequência
+df_bruto_fred = {"Diária": [], "Mensal": [], "Trimestral": []}
+
+for serie in input_fred.index:
+  df_bruto_fred[input_fred.iloc[serie]["Frequência"]].append(le_bruto("FRED", input_fred.iloc[serie]["Identificador"]))
+
+
+# Dados do IFI
+df_bruto_ifi = le_bruto("IFI", input_ifi["Identificador"].iloc[0])
\ No newline at end of file
@@ -1,235 +1,109 @@
+# No tratamento incremental, trata só os dados brutos a partir da data de corte
+# (ver calcula_corte_tratamento); 05-disponibilizacao.py atualiza a base salva
+corte_tratamento = calcula_corte_tratamento() if tratamento_incremental else None
+
+if corte_tratamento is not None:
+  colunas_salvas = colunas_base_salva()
+  for df_bruto_fonte in [df_bruto_bcb_sgs, df_bruto_ipeadata, df_bruto_ibge_sidra, df_bruto_fred]:
+    for f in df_bruto_fonte:
+      df_bruto_fonte[f] = [recorta_bruto(df, corte_tratamento, colunas_salvas) for df in df_bruto_fonte[f]]
+  df_bruto_bcb_odata = {nome: recorta_bruto(df, corte_tratamento, colunas_salvas) for nome, df in df_bruto_bcb_odata.items()}
+  df_bruto_ifi = recorta_bruto(df_bruto_ifi, corte_tratamento, colunas_salvas)
+
+
+# Regras de conversão de frequência de cada série (ver regras_agregacao)
+regras_conversao = regras_agregacao(df_metadados)
+
+
 # Cruza dados do BCB/SGS
 df_tratado_bcb_sgs = df_bruto_bcb_sgs.copy()
 
 for f in df_tratado_bcb_sgs.items():
-  df_temp = f[1][0]
-  for df in f[1][1:]:
-    df_temp = df_temp.join(other = df, how = "outer")
-  df_tratado_bcb_sgs[f[0]] = df_temp
+  df_tratado_bcb_sgs[f[0]] = junta_series(f[1])
 
-# Agrega dados de frequência diária para mensal por média ou início de mês
+# Agrega dados de frequência diária para mensal conforme a regra de cada série
+# (média ou, para a Selic, início de mês), com a Selic por último
 df_tratado_bcb_sgs["Mensal"] = df_tratado_bcb_sgs["Mensal"].join(
     other = (
-        df_tratado_bcb_sgs["Diária"]
-        .astype(float)
-        .filter(input_bcb_sgs.query("Identificador != 'selic'")["Identificador"].to_list())
-        .resample("MS")
-        .mean()
-        .join(
-            other = (
-                df_tratado_bcb_sgs["Diária"]
-                .filter(["selic"])
-                .reset_index()
-                .assign(data = lambda x: x.data.dt.to_period("M").dt.to_timestamp())
-                .groupby("data")
-                .head(1)
-                .set_index("data")
-            ),
-            how = "outer"
-        )
+        converte_frequencia(
+            df_tratado_bcb_sgs["Diária"].filter(input_bcb_sgs.query("Identificador != 'selic'")["Identificador"].to_list() + ["selic"]),
+            "M",
+            regras_conversao
+            )
         .query("index >= '2000-01-01'")
     ),
     how = "outer"
 ).astype(float)
 
 
-# Filtra expectativas curto prazo ~1 mês à frente e agrega pela média
-df_tratado_bcb_odata_ipca_cp = (
-    df_bruto_bcb_odata[0]
-    .assign(
-        DataReferencia = lambda x: pd.to_datetime(x.DataReferencia, format = "%m/%Y"),
-        horizonte = lambda x: ((x.DataReferencia - x.Data) / np.timedelta64(30, "D")).astype(int),
-        data = lambda x: x.Data.dt.to_period("M").dt.to_timestamp()
-        )
-    .query("horizonte == 1")
-    .groupby(["data"], as_index = False)["expec_ipca_top5_curto_prazo"]
-    .mean()
-)
-
-# Filtra expectativas médio prazo ~6 mês à frente e agrega pela média
-df_tratado_bcb_odata_ipca_mp = (
-    df_bruto_bcb_odata[1]
-    .assign(
-        DataReferencia = lambda x: pd.to_datetime(x.DataReferencia, format = "%m/%Y"),
-        horizonte = lambda x: ((x.DataReferencia - x.Data) / np.timedelta64(30, "D")).astype(int),
-        data = lambda x: x.Data.dt.to_period("M").dt.to_timestamp()
-        )
-    .query("horizonte == 6")
-    .groupby(["data"], as_index = False)["expec_ipca_top5_medio_prazo"]
-    .mean()
-)
-
-# Filtra expectativas longo prazo ~1 ano à frente e agrega pela média
-df_tratado_bcb_odata_selic = (
-    df_bruto_bcb_odata[2]
-    .assign(
-        DataReferencia = lambda x: pd.to_datetime(x.DataReferencia, format = "%Y"),
-        data = lambda x: x.Data.dt.to_period("M").dt.to_timestamp(),
-        horizonte = lambda x: ((x.DataReferencia - x.Data) / np.timedelta64(365, "D")).astype(int)
-        )
-    .query("horizonte == 1")
-    .groupby(["data"], as_index = False)["expec_selic"]
-    .mean()
-)
-
-# Filtra expectativas curto prazo ~1 mês à frente e agrega pela média
-df_tratado_bcb_odata_cambio = (
-    df_bruto_bcb_odata[3]
-    .assign(
-        DataReferencia = lambda x: pd.to_datetime(x.DataReferencia, format = "%m/%Y"),
-        horizonte = lambda x: ((x.DataReferencia - x.Data) / np.timedelta64(30, "D")).astype(int),
-        data = lambda x: x.Data.dt.to_period("M").dt.to_timestamp()
-        )
-    .query("horizonte == 1")
-    .groupby(["data"], as_index = False)["expec_cambio"]
-    .mean()
-)
-
-# Filtra expectativas curto prazo ~12 meses à frente e agrega pela média
-df_tratado_bcb_odata_ipca_lp = (
-    df_bruto_bcb_odata[4]
-    .assign(data = lambda x: x.Data.dt.to_period("M").dt.to_timestamp())
-    .groupby(["data"], as_index = False)["expec_ipca_12m"]
-    .mean()
-)
-
-# Filtra expectativas médio prazo ~9 meses à frente e agrega pela média
-df_tratado_bcb_odata_pib = (
-    df_bruto_bcb_odata[5]
-    .assign(
-        DataReferencia = lambda x: pd.PeriodIndex(
-            x.DataReferencia.str.replace(r"(\d{1})/(\d{4})", r"\2-Q\1", regex = True),
-            freq = "Q"
-            ).to_timestamp(),
-        data = lambda x: x.Data.dt.to_period("Q").dt.to_timestamp(),
-        horizonte = lambda x: ((x.DataReferencia - x.Data) / np.timedelta64(30, "D")).astype(int)
-      )
-    .query("horizonte == 9")
-    .groupby(["data"], as_index = False)["expec_pib"]
-    .mean()
-)
-
-# Filtra expectativas longo prazo ~1 ano à frente e agrega pela média
-df_tratado_bcb_odata_primario = (
-    df_bruto_bcb_odata[6]
-    .assign(
-        DataReferencia = lambda x: pd.to_datetime(x.DataReferencia, format = "%Y"),
-        data = lambda x: x.Data.dt.to_period("M").dt.to_timestamp(),
-        horizonte = lambda x: ((x.DataReferencia - x.Data) / np.timedelta64(365, "D")).astype(int)
-        )
-    .query("horizonte == 1")
-    .groupby(["data"], as_index = False)["expec_primario"]
-    .mean()
-)
+# Agrega as expectativas do Focus conforme expectativas_focus (indicador,
+# formato da data de referência, horizonte e frequência)
+df_tratado_bcb_odata = agrega_expectativas(df_bruto_bcb_odata)
+df_tratado_bcb_odata_pib = df_tratado_bcb_odata["expec_pib"]
 
 # Cruza dados de mesma frequência
-df_tratado_bcb_odata_lista = [
-    df_tratado_bcb_odata_ipca_mp,
-    df_tratado_bcb_odata_ipca_lp,
-    df_tratado_bcb_odata_selic,
-    df_tratado_bcb_odata_cambio,
-    df_tratado_bcb_odata_primario
-  ]
-
-df_tratado_bcb_odata_mensal = df_tratado_bcb_odata_ipca_cp.set_index("data")
-
-for df in df_tratado_bcb_odata_lista:
-  df_tratado_bcb_odata_mensal = df_tratado_bcb_odata_mensal.join(
-      other = df.set_index("data"),
-      how = "outer"
-      )
+df_tratado_bcb_odata_mensal = junta_series(
+    df.set_index("data")
+    for nome, df in df_tratado_bcb_odata.items()
+    if expectativas_focus[nome]["freq"] == "M"
+    )
 
 
 # Cruza dados do IPEADATA
 df_tratado_ipeadata = df_bruto_ipeadata.copy()
 
 for f in df_tratado_ipeadata.items():
-  df_temp = f[1][0].assign(data = lambda x: pd.to_datetime(x.data, utc = True)).set_index("data")
-  for df in f[1][1:]:
-    df_temp = df_temp.join(
-        other = df.assign(data = lambda x: pd.to_datetime(x.data, utc = True)).set_index("data"),
-        how = "outer"
-        )
-  df_tratado_ipeadata[f[0]] = df_temp
+  df_tratado_ipeadata[f[0]] = junta_series(
+      df.assign(data = lambda x: pd.to_datetime(x.data, utc = True)).set_index("data")
+      for df in f[1]
+      )
 
-# Agrega dados de frequência diária para mensal por média
+# Agrega dados de frequência diária para mensal conforme a regra de cada série
 df_tratado_ipeadata["Mensal"] = (
     df_tratado_ipeadata["Mensal"]
     .reset_index()
     .assign(data = lambda x: x.data.dt.to_period("M").dt.to_timestamp())
     .set_index("data")
     .join(
-        other = (
-            df_tratado_ipeadata["Diária"]
-            .reset_index()
-            .assign(data = lambda x: x.data.dt.to_period("M").dt.to_timestamp())
-            .set_index("data")
-            .resample("MS")
-            .mean()
-        ),
+        other = converte_frequencia(df_tratado_ipeadata["Diária"], "M", regras_conversao),
         how = "outer"
       )
     .query("index >= '2000-01-01'")
 )
 
 
-# Cruza dados do IBGE/SIDRA
+# Cruza dados do IBGE/SIDRA (períodos AAAAMM, AAAA0T ou AAAA)
 df_tratado_ibge_sidra = df_bruto_ibge_sidra.copy()
 
 for f in df_tratado_ibge_sidra.items():
-  df_temp = (
-      f[1][0]
-      .iloc[1:]
+  df_tratado_ibge_sidra[f[0]] = junta_series(
+      df
       .assign(
           data = lambda x: pd.PeriodIndex(
-            x.data.str.replace(r"(\d{4})(\d{1})(\d{1})", r"\1-\2\3" if f[0] == "Mensal" else r"\1-Q\3", regex = True),
-            freq = "M" if f[0] == "Mensal" else "Q"
+            x.data if f[0] == "Anual" else x.data.str.replace(r"(\d{4})(\d{1})(\d{1})", r"\1-\2\3" if f[0] == "Mensal" else r"\1-Q\3", regex = True),
+            freq = {"Mensal": "M", "Trimestral": "Q", "Anual": "Y"}[f[0]]
             ).to_timestamp()
         )
       .set_index("data")
-  )
-  for df in f[1][1:]:
-    df_temp = df_temp.join(
-        other = (
-            df
-            .iloc[1:]
-            .assign(
-                data = lambda x: pd.PeriodIndex(
-                  x.data.str.replace(r"(\d{4})(\d{1})(\d{1})", r"\1-\2\3" if f[0] == "Mensal" else r"\1-Q\3", regex = True),
-                  freq = "M" if f[0] == "Mensal" else "Q"
-                  ).to_timestamp()
-              )
-            .set_index("data")
-        ),
-        how = "outer"
-        )
-  df_tratado_ibge_sidra[f[0]] = df_temp
+      for df in f[1]
+      )
 
 
 # Cruza dados do FRED
 df_tratado_fred = df_bruto_fred.copy()
 
 for f in df_tratado_fred.items():
-  df_temp = f[1][0].assign(observation_date = lambda x: pd.to_datetime(x.observation_date)).set_index("observation_date")
-  for df in f[1][1:]:
-    df_temp = df_temp.join(
-        other = df.assign(observation_date = lambda x: pd.to_datetime(x.observation_date)).set_index("observation_date"),
-        how = "outer"
-        )
-  df_temp = df_temp.rename_axis(index='data')  
-  df_tratado_fred[f[0]] = df_temp
+  df_tratado_fred[f[0]] = junta_series(
+      df.assign(observation_date = lambda x: pd.to_datetime(x.observation_date)).set_index("observation_date")
+      for df in f[1]
+      ).rename_axis(index = "data")
 
-# Agrega dados de frequência diária para mensal por média
+# Agrega dados de frequência diária para mensal conforme a regra de cada série
 df_tratado_fred["Mensal"] = (
     df_tratado_fred["Mensal"]
     .set_index(pd.to_datetime(df_tratado_fred["Mensal"].index))
     .join(
-        other = (
-            df_tratado_fred["Diária"]
-            .set_index(pd.to_datetime(df_tratado_fred["Diária"].index))
-            .resample("MS")
-            .mean()
-        ),
+        other = converte_frequencia(df_tratado_fred["Diária"], "M", regras_conversao),
         how = "outer"
       )
     .query("index >= '2000-01-01'")
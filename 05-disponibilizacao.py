@@ -1,65 +1,47 @@
-# Cria pasta dados se não existir
+# Cria pasta dados se não existir (no tratamento incremental, as bases salvas
+# são atualizadas a partir de corte_tratamento, ver 04-tratamento.py)
 pasta = "dados"
 if not os.path.exists(pasta):
   os.makedirs(pasta)
 
+# Séries gravadas em float32 no modo compacto (ver compacta_base)
+precisao_simples = series_precisao_simples(df_metadados) if modo_compacto else []
 
-# Diária
-df_diaria = (
-    df_tratado_bcb_sgs["Diária"]
-    .join(
-        other=df_tratado_ipeadata["Diária"].reset_index().assign(
-            data=lambda x: pd.to_datetime(x['data'].dt.strftime("%Y-%m-%d"))
-        ).set_index("data"),
-        how="outer"
-    )
-    .join(other=df_tratado_fred["Diária"], how="outer")
-    .reset_index()
-    .assign(data=lambda x: pd.to_datetime(x['data']))  
-    .query("data >= @pd.to_datetime('2000-01-01')")
-    .set_index('data')
-)
-df_diaria.to_parquet(f"{pasta}/df_diaria.parquet")
 
-# Mensal
-temp_lista = [
-    df_tratado_bcb_sgs["Mensal"],
-    df_tratado_bcb_odata_mensal,
-    df_tratado_ipeadata["Mensal"],
-    df_tratado_ibge_sidra["Mensal"],
-    df_tratado_fred["Mensal"]
-]
+# Séries de cada base disponibilizada
+bases = {
+    "df_diaria": [
+        df_tratado_bcb_sgs["Diária"],
+        df_tratado_ipeadata["Diária"].set_axis(df_tratado_ipeadata["Diária"].index.tz_convert(None).normalize(), axis = "index"),
+        df_tratado_fred["Diária"]
+        ],
+    "df_mensal": [
+        df_tratado_bcb_sgs["Mensal"],
+        df_tratado_bcb_odata_mensal,
+        df_tratado_ipeadata["Mensal"],
+        df_tratado_ibge_sidra["Mensal"],
+        df_tratado_fred["Mensal"]
+        ],
+    "df_trimestral": [
+        df_tratado_bcb_sgs["Trimestral"],
+        df_tratado_bcb_odata_pib.set_index("data"),
+        df_tratado_ibge_sidra["Trimestral"],
+        df_tratado_fred["Trimestral"],
+        df_tratado_ifi
+        ],
+    "df_anual": [
+        df_tratado_bcb_sgs["Anual"],
+        df_tratado_ibge_sidra["Anual"]
+        ]
+    }
 
-df_mensal = (
-  temp_lista[0]
-  .join(other = temp_lista[1:], how = "outer")
-  .query("index >= @pd.to_datetime('2000-01-01')")
-  .astype(float)
-  )
-df_mensal.to_parquet(f"{pasta}/df_mensal.parquet")
+# Cruza, atualiza (no tratamento incremental) e grava cada base
+for nome, dfs in bases.items():
+  arquivo = f"{pasta}/{nome}.parquet"
+  compacta_base(monta_base(dfs, arquivo, corte_tratamento), nome, precisao_simples).to_parquet(arquivo)
 
-# Trimestral
-temp_lista = [
-    df_tratado_bcb_sgs["Trimestral"],
-    df_tratado_bcb_odata_pib.set_index("data"),
-    df_tratado_ibge_sidra["Trimestral"],
-    df_tratado_fred["Trimestral"],
-    df_tratado_ifi
-]
 
-df_trimestral = (
-  temp_lista[0]
-  .join(other = temp_lista[1:], how = "outer")
-  .query("index >= @pd.to_datetime('2000-01-01')")
-  .astype(float)
-)
-df_trimestral.index = pd.to_datetime(df_trimestral.index)
-df_trimestral.to_parquet(f"{pasta}/df_trimestral.parquet")
-
-# Anual
-df_anual = (
-  df_tratado_bcb_sgs["Anual"]
-  .query("index >= @pd.to_datetime('2000-01-01')")
-  .astype(float)
-)
-df_anual.to_parquet(f"{pasta}/df_anual.parquet")
+# Registra como marcas d'água as últimas observações sondadas antes desta
+# execução (ver sonda_fontes), agora refletidas na base
+if os.path.exists(os.path.join(pasta_cache, "marcas_sondadas.json")):
+  os.replace(os.path.join(pasta_cache, "marcas_sondadas.json"), arquivo_marcas_dagua)
\ No newline at end of file
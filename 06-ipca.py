@@ -8,6 +8,10 @@ import pandas as pd
 import numpy as np
 import os
 
+# Funções compartilhadas do projeto (cache HTTP, coleta etc.)
+exec(open("01-bibliotecas.py").read())
+exec(open("02-funcoes.py").read())
+
 
 # Definições e configurações globais
 h = 12 # horizonte de previsão
@@ -34,23 +38,15 @@ def transformar(x, tipo):
 
 
 # Planilha de metadados
-metadados = (
-    pd.read_excel(
-        io = "https://docs.google.com/spreadsheets/d/1x8Ugm7jVO7XeNoxiaFPTPm1mfVc3JUNvvVqVjCioYmE/export?format=xlsx",
-        sheet_name = "Metadados",
-        dtype = str,
-        index_col = "Identificador"
-        )
-    .filter(["Transformação"])
-)
+metadados = carrega_metadados().filter(["Transformação"])
 
 
 # Importa dados online
-dados_brutos = pd.read_parquet("dados/df_mensal.parquet")
+dados_brutos = le_base("dados/df_mensal.parquet")
 
 
 # Converte frequência
-dados_tratados = dados_brutos.asfreq("MS")
+dados_tratados = converte_frequencia(dados_brutos, "M", regra_padrao = "last")
 
 # Separa Y
 y = dados_tratados.ipca.dropna()
@@ -129,13 +125,11 @@ periodo_previsao = pd.date_range(
 
 # Coleta dados de expectativas de inflação (expec_ipca_top5_curto_prazo)
 dados_focus_exp_ipca = (
-    pd.read_csv(
-        filepath_or_buffer = f"https://olinda.bcb.gov.br/olinda/servico/Expectativas/versao/v1/odata/ExpectativasMercadoTop5Mensais?$filter=Indicador%20eq%20'IPCA'%20and%20tipoCalculo%20eq%20'C'%20and%20Data%20ge%20'{periodo_previsao.min().strftime('%Y-%m-%d')}'&$format=text/csv",
-        decimal = ",",
-        converters = {
-            "Data": pd.to_datetime,
-            "DataReferencia": lambda x: pd.to_datetime(x, format = "%m/%Y")
-            }
+    le_csv_em_blocos(
+        baixa_arquivo(monta_url_odata(f"https://olinda.bcb.gov.br/olinda/servico/Expectativas/versao/v1/odata/ExpectativasMercadoTop5Mensais?$filter=Indicador%20eq%20'IPCA'%20and%20tipoCalculo%20eq%20'C'%20and%20Data%20ge%20'{periodo_previsao.min().strftime('%Y-%m-%d')}'&$format=text/csv", colunas = "Data,DataReferencia,Mediana"), "BCB/ODATA"),
+        filtro = lambda x: x[x.DataReferencia.isin(periodo_previsao)],
+        esquema = esquemas["Focus/Mensal"],
+        decimal = ","
         ))
 
 # Data do relatório Focus usada para construir cenário para expectativas de inflação
@@ -189,13 +183,11 @@ dados_cenario_ic_br = (
 
 # Coleta dados de expectativas do câmbio (cambio_brl_eur)
 dados_focus_cambio = (
-    pd.read_csv(
-        filepath_or_buffer = f"https://olinda.bcb.gov.br/olinda/servico/Expectativas/versao/v1/odata/ExpectativasMercadoTop5Mensais?$filter=Indicador%20eq%20'C%C3%A2mbio'%20and%20tipoCalculo%20eq%20'M'%20and%20Data%20ge%20'{modelo1.last_window.index[0].strftime('%Y-%m-%d')}'&$format=text/csv",
-        decimal = ",",
-        converters = {
-            "Data": pd.to_datetime,
-            "DataReferencia": lambda x: pd.to_datetime(x, format = "%m/%Y")
-            }
+    le_csv_em_blocos(
+        baixa_arquivo(monta_url_odata(f"https://olinda.bcb.gov.br/olinda/servico/Expectativas/versao/v1/odata/ExpectativasMercadoTop5Mensais?$filter=Indicador%20eq%20'C%C3%A2mbio'%20and%20tipoCalculo%20eq%20'M'%20and%20Data%20ge%20'{modelo1.last_window.index[0].strftime('%Y-%m-%d')}'&$format=text/csv", colunas = "Data,DataReferencia,Mediana"), "BCB/ODATA"),
+        filtro = lambda x: x[x.DataReferencia.isin(periodo_previsao) | (x.DataReferencia == modelo1.last_window.index[0])],
+        esquema = esquemas["Focus/Mensal"],
+        decimal = ","
         ))
 
 # Data do relatório Focus usada para construir cenário para câmbio
@@ -307,7 +299,7 @@ previsao2 = (
 
 y.to_frame().join(x[x_reg]).to_csv("dados/ipca.csv")
 prompt = f"""
-Assume that you are in {pd.to_datetime("today").strftime("%B %d, %Y")}. 
+Assume that you are in {data_hoje.strftime("%B %d, %Y")}. 
 Please give me your best forecast of month-over-month IPCA inflation rate in 
 Brazil, published by IBGE, for {periodo_previsao.min().strftime("%B %Y")} to 
 {periodo_previsao.max().strftime("%B %Y")}. Use the historical IPCA data from 
@@ -315,15 +307,12 @@ the attached CSV file named "ipca.csv", where "ipca" is the target
 column, "data" is the date column and the others are exogenous variables. 
 Please give me numeric values for these forecasts, in a CSV like format with 
 a header, and nothing more. Do not use any information that was not available 
-to you as of {pd.to_datetime("today").strftime("%B %d, %Y")} to formulate these 
+to you as of {data_hoje.strftime("%B %d, %Y")} to formulate these 
 forecasts.
 """
 
-genai.configure(api_key = os.environ["GEMINI_API_KEY"])
-modelo_ia = genai.GenerativeModel(model_name = "gemini-1.5-pro")
-arquivo = genai.upload_file("dados/ipca.csv")
 previsao3 = pd.read_csv(
-    filepath_or_buffer = StringIO(modelo_ia.generate_content([prompt, arquivo]).text),
+    filepath_or_buffer = StringIO(gera_previsao_ia(prompt, "dados/ipca.csv")),
     names = ["date", "Valor"],
     skiprows = 1,
     index_col = "date",
@@ -340,4 +329,4 @@ pd.concat([
     previsao1,
     previsao2,
     previsao3
-    ]).to_parquet("previsao/ipca.parquet")
+    ]).pipe(compacta_base, "previsao/ipca").to_parquet("previsao/ipca.parquet")
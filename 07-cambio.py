@@ -8,6 +8,10 @@ import pandas as pd
 import numpy as np
 import os
 
+# Funções compartilhadas do projeto (cache HTTP, coleta etc.)
+exec(open("01-bibliotecas.py").read())
+exec(open("02-funcoes.py").read())
+
 
 # Definições e configurações globais
 h = 12 # horizonte de previsão
@@ -34,27 +38,18 @@ def transformar(x, tipo):
 
 
 # Planilha de metadados
-metadados = (
-    pd.read_excel(
-        io = "https://docs.google.com/spreadsheets/d/1x8Ugm7jVO7XeNoxiaFPTPm1mfVc3JUNvvVqVjCioYmE/export?format=xlsx",
-        sheet_name = "Metadados",
-        dtype = str,
-        index_col = "Identificador"
-        )
-    .filter(["Transformação"])
-)
+metadados = carrega_metadados().filter(["Transformação"])
 
 # Importa dados online
-dados_brutos_m = pd.read_parquet("dados/df_mensal.parquet")
-dados_brutos_t = pd.read_parquet("dados/df_trimestral.parquet")
-dados_brutos_a = pd.read_parquet("dados/df_anual.parquet")
+dados_brutos_m = le_base("dados/df_mensal.parquet")
+dados_brutos_t = le_base("dados/df_trimestral.parquet")
+dados_brutos_a = le_base("dados/df_anual.parquet")
 
 # Converte frequência
 dados_tratados = (
-    dados_brutos_m
-    .asfreq("MS")
+    converte_frequencia(dados_brutos_m, "M", regra_padrao = "last")
     .join(
-        other = dados_brutos_a.asfreq("MS").ffill(),
+        other = converte_frequencia(dados_brutos_a, "M", regra_padrao = "ffill"),
         how = "outer"
         )
     .join(
@@ -63,8 +58,7 @@ dados_tratados = (
             .filter(["us_gdp", "pib"])
             .dropna()
             .assign(us_gdp = lambda x: ((x.us_gdp.rolling(4).mean() / x.us_gdp.rolling(4).mean().shift(4)) - 1) * 100)
-            .asfreq("MS")
-            .ffill()
+            .pipe(converte_frequencia, "M", regra_padrao = "ffill")
         ),
         how = "outer"
     )
@@ -132,13 +126,10 @@ periodo_previsao = pd.date_range(
 
 # Coleta dados de expectativas da Selic (selic)
 dados_focus_selic = (
-    pd.read_csv(
-        filepath_or_buffer = f"https://olinda.bcb.gov.br/olinda/servico/Expectativas/versao/v1/odata/ExpectativasMercadoTop5Selic?$filter=Data%20ge%20'{modelo1.last_window.index[0].strftime('%Y-%m-%d')}'%20and%20tipoCalculo%20eq%20'C'&$format=text/csv",
-        decimal = ",",
-        converters = {
-            "Data": pd.to_datetime,
-            "DataReferencia": lambda x: pd.to_datetime(x, format = "%m/%Y")
-            }
+    le_csv_em_blocos(
+        baixa_arquivo(f"https://olinda.bcb.gov.br/olinda/servico/Expectativas/versao/v1/odata/ExpectativasMercadoTop5Selic?$filter=Data%20ge%20'{modelo1.last_window.index[0].strftime('%Y-%m-%d')}'%20and%20tipoCalculo%20eq%20'C'&$format=text/csv", "BCB/ODATA"),
+        esquema = esquemas["Focus/Mensal"],
+        decimal = ","
         ))
 
 # Constrói cenário para expectativas de juros (selic)
@@ -153,13 +144,11 @@ dados_cenario_selic = (
 
 # Coleta dados de expectativas do câmbio (expec_cambio)
 dados_focus_cambio = (
-    pd.read_csv(
-        filepath_or_buffer = f"https://olinda.bcb.gov.br/olinda/servico/Expectativas/versao/v1/odata/ExpectativaMercadoMensais?$filter=Indicador%20eq%20'C%C3%A2mbio'%20and%20baseCalculo%20eq%200%20and%20Data%20ge%20'{modelo1.last_window.index[0].strftime('%Y-%m-%d')}'&$format=text/csv",
-        decimal = ",",
-        converters = {
-            "Data": pd.to_datetime,
-            "DataReferencia": lambda x: pd.to_datetime(x, format = "%m/%Y")
-            }
+    le_csv_em_blocos(
+        baixa_arquivo(monta_url_odata(f"https://olinda.bcb.gov.br/olinda/servico/Expectativas/versao/v1/odata/ExpectativaMercadoMensais?$filter=Indicador%20eq%20'C%C3%A2mbio'%20and%20baseCalculo%20eq%200%20and%20Data%20ge%20'{modelo1.last_window.index[0].strftime('%Y-%m-%d')}'&$format=text/csv", colunas = "Data,DataReferencia,Mediana"), "BCB/ODATA"),
+        filtro = lambda x: x[x.DataReferencia.isin(periodo_previsao) | (x.DataReferencia == modelo1.last_window.index[0])],
+        esquema = esquemas["Focus/Mensal"],
+        decimal = ","
         ))
 
 # Data do relatório Focus usada para construir cenário para câmbio
@@ -292,7 +281,7 @@ previsao2 = (
 
 y.to_frame().join(x[x_reg]).to_csv("dados/cambio.csv")
 prompt = f"""
-Assume that you are in {pd.to_datetime("today").strftime("%B %d, %Y")}. 
+Assume that you are in {data_hoje.strftime("%B %d, %Y")}. 
 Please give me your best forecast of Exchange Rate for Brazil, measured in BRL/USD 
 and published by Banco Central do Brasil, for {periodo_previsao.min().strftime("%B %Y")} 
 to {periodo_previsao.max().strftime("%B %Y")}. Use the historical Exchange Rate 
@@ -300,15 +289,12 @@ data from the attached CSV file named "cambio.csv", where "cambio" is the target
 column, "data" is the date column and the others are exogenous variables. 
 Please give me numeric values for these forecasts, in a CSV like format with 
 a header, and nothing more. Do not use any information that was not available 
-to you as of {pd.to_datetime("today").strftime("%B %d, %Y")} to formulate these 
+to you as of {data_hoje.strftime("%B %d, %Y")} to formulate these 
 forecasts.
 """
 
-genai.configure(api_key = os.environ["GEMINI_API_KEY"])
-modelo_ia = genai.GenerativeModel(model_name = "gemini-1.5-pro")
-arquivo = genai.upload_file("dados/cambio.csv")
 previsao3 = pd.read_csv(
-    filepath_or_buffer = StringIO(modelo_ia.generate_content([prompt, arquivo]).text),
+    filepath_or_buffer = StringIO(gera_previsao_ia(prompt, "dados/cambio.csv")),
     names = ["date", "Valor"],
     skiprows = 1,
     index_col = "date",
@@ -325,4 +311,4 @@ pd.concat(
     previsao1,
     previsao2,
     previsao3
-    ]).to_parquet("previsao/cambio.parquet")
+    ]).pipe(compacta_base, "previsao/cambio").to_parquet("previsao/cambio.parquet")
@@ -8,6 +8,10 @@ import pandas as pd
 import numpy as np
 import os
 
+# Funções compartilhadas do projeto (cache HTTP, coleta etc.)
+exec(open("01-bibliotecas.py").read())
+exec(open("02-funcoes.py").read())
+
 # Definições e configurações globais
 h = 4 # horizonte de previsão
 inicio_treino = pd.to_datetime("1997-10-01") # amostra inicial de treinamento
@@ -31,32 +35,17 @@ def transformar(x, tipo):
   return switch[tipo](x)
 
 # Planilha de metadados
-metadados = (
-    pd.read_excel(
-        io = "https://docs.google.com/spreadsheets/d/1x8Ugm7jVO7XeNoxiaFPTPm1mfVc3JUNvvVqVjCioYmE/export?format=xlsx",
-        sheet_name = "Metadados",
-        dtype = str,
-        index_col = "Identificador"
-        )
-    .filter(["Transformação"])
-)
+metadados = carrega_metadados().filter(["Transformação"])
 
 # Importa dados online
-dados_brutos_m = pd.read_parquet("dados/df_mensal.parquet")
-dados_brutos_t = pd.read_parquet("dados/df_trimestral.parquet")
+dados_brutos_m = le_base("dados/df_mensal.parquet")
+dados_brutos_t = le_base("dados/df_trimestral.parquet")
 
 # Converte frequência
 dados_tratados = (
-    dados_brutos_m
-    .resample("QS")
-    .mean()
+    converte_frequencia(dados_brutos_m, "Q")
     .join(
-        other = (
-            dados_brutos_t
-            .set_index(pd.PeriodIndex(dados_brutos_t.index, freq = "Q").to_timestamp())
-            .resample("QS")
-            .mean()
-            ),
+        other = converte_frequencia(dados_brutos_t, "Q"),
         how = "outer"
     )
     .rename_axis("data", axis = "index")
@@ -149,10 +138,15 @@ dados_cenario_uci_ind_fgv = (
 )
 
 # Coleta dados de expectativas do PIB (expec_pib)
-dados_focus_expec_pib = pd.read_csv(
-    filepath_or_buffer = f"https://olinda.bcb.gov.br/olinda/servico/Expectativas/versao/v1/odata/ExpectativasMercadoTrimestrais?$filter=Indicador%20eq%20'PIB%20Total'%20and%20baseCalculo%20eq%200%20and%20Data%20ge%20'{periodo_previsao.min().strftime('%Y-%m-%d')}'&$format=text/csv",
-    decimal = ",",
-    converters = {"Data": pd.to_datetime}
+dados_focus_expec_pib = le_csv_em_blocos(
+    baixa_arquivo(monta_url_odata(f"https://olinda.bcb.gov.br/olinda/servico/Expectativas/versao/v1/odata/ExpectativasMercadoTrimestrais?$filter=Indicador%20eq%20'PIB%20Total'%20and%20baseCalculo%20eq%200%20and%20Data%20ge%20'{periodo_previsao.min().strftime('%Y-%m-%d')}'&$format=text/csv", colunas = "Data,DataReferencia,Mediana"), "BCB/ODATA"),
+    filtro = lambda x: x[
+        pd.PeriodIndex(x.DataReferencia.str.replace(r"(\d{1})/(\d{4})", r"\2-Q\1", regex = True), freq = "Q")
+        .to_timestamp()
+        .isin(periodo_previsao.union([modelo1.last_window.index[1]]))
+        ],
+    esquema = esquemas["Focus"],
+    decimal = ","
     )
 
 # Data do relatório Focus usada para construir cenário para Expectativas PIB (expec_pib)
@@ -272,7 +266,7 @@ previsao2 = (
 
 y.to_frame().join(x[x_reg]).to_csv("dados/pib.csv")
 prompt = f"""
-Assume that you are in {pd.to_datetime("today").strftime("%B %d, %Y")}. 
+Assume that you are in {data_hoje.strftime("%B %d, %Y")}. 
 Please give me your best forecast of Gross Domestic Product (GDP) for Brazil, 
 measured in annual percentage variation (accumulated rate in four quarters in 
 relation to the same period of the previous year) and published by IBGE, for 
@@ -281,15 +275,12 @@ Use the historical GDP data from the attached CSV file named "pib.csv", where "p
 is the target column, "data" is the date column and the others are exogenous variables. 
 Please give me numeric values for these forecasts, in a CSV like format with 
 a header, and nothing more. Do not use any information that was not available 
-to you as of {pd.to_datetime("today").strftime("%B %d, %Y")} to formulate these 
+to you as of {data_hoje.strftime("%B %d, %Y")} to formulate these 
 forecasts.
 """
 
-genai.configure(api_key = os.environ["GEMINI_API_KEY"])
-modelo_ia = genai.GenerativeModel(model_name = "gemini-1.5-pro")
-arquivo = genai.upload_file("dados/pib.csv")
 previsao3 = pd.read_csv(
-    filepath_or_buffer = StringIO(modelo_ia.generate_content([prompt, arquivo]).text),
+    filepath_or_buffer = StringIO(gera_previsao_ia(prompt, "dados/pib.csv")),
     names = ["date", "Valor"],
     skiprows = 1,
     index_col = "date",
@@ -306,4 +297,4 @@ pd.concat(
     previsao1,
     previsao2,
     previsao3
-    ]).to_parquet("previsao/pib.parquet")
+    ]).pipe(compacta_base, "previsao/pib").to_parquet("previsao/pib.parquet")
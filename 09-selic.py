@@ -11,6 +11,10 @@ import pandas as pd
 import numpy as np
 import os
 
+# Funções compartilhadas do projeto (cache HTTP, coleta etc.)
+exec(open("01-bibliotecas.py").read())
+exec(open("02-funcoes.py").read())
+
 # Definições e configurações globais
 h = 12 # horizonte de previsão
 inicio_treino = pd.to_datetime("2004-01-01") # amostra inicial de treinamento
@@ -34,26 +38,17 @@ def transformar(x, tipo):
   return switch[tipo](x)
 
 # Planilha de metadados
-metadados = (
-    pd.read_excel(
-        io = "https://docs.google.com/spreadsheets/d/1x8Ugm7jVO7XeNoxiaFPTPm1mfVc3JUNvvVqVjCioYmE/export?format=xlsx",
-        sheet_name = "Metadados",
-        dtype = str,
-        index_col = "Identificador"
-        )
-    .filter(["Transformação"])
-)
+metadados = carrega_metadados().filter(["Transformação"])
 
 # Importa dados online
-dados_brutos_m = pd.read_parquet("dados/df_mensal.parquet")
-dados_brutos_a = pd.read_parquet("dados/df_anual.parquet")
+dados_brutos_m = le_base("dados/df_mensal.parquet")
+dados_brutos_a = le_base("dados/df_anual.parquet")
 
 # Converte frequência
 dados_tratados = (
-    dados_brutos_m
-    .asfreq("MS")
+    converte_frequencia(dados_brutos_m, "M", regra_padrao = "last")
     .join(
-        other = dados_brutos_a.asfreq("MS").ffill(),
+        other = converte_frequencia(dados_brutos_a, "M", regra_padrao = "ffill"),
         how = "outer"
         )
     .rename_axis("data", axis = "index")
@@ -152,24 +147,22 @@ dados_cenario_constante = (
 
 # Coleta dados de expectativas de inflação (expec_ipca_12m)
 dados_focus_expec_ipca_12m = (
-    pd.read_csv(
-        filepath_or_buffer = f"https://olinda.bcb.gov.br/olinda/servico/Expectativas/versao/v1/odata/ExpectativasMercadoInflacao12Meses?$filter=Indicador%20eq%20'IPCA'%20and%20Suavizada%20eq%20'S'%20and%20baseCalculo%20eq%200%20and%20Data%20ge%20'{(periodo_previsao.min() - pd.offsets.MonthBegin(3)).strftime('%Y-%m-%d')}'&$format=text/csv",
-        decimal = ",",
-        converters = {"Data": pd.to_datetime}
+    le_csv_em_blocos(
+        baixa_arquivo(monta_url_odata(f"https://olinda.bcb.gov.br/olinda/servico/Expectativas/versao/v1/odata/ExpectativasMercadoInflacao12Meses?$filter=Indicador%20eq%20'IPCA'%20and%20Suavizada%20eq%20'S'%20and%20baseCalculo%20eq%200%20and%20Data%20ge%20'{(periodo_previsao.min() - pd.offsets.MonthBegin(3)).strftime('%Y-%m-%d')}'&$format=text/csv", colunas = "Data,Mediana"), "BCB/ODATA"),
+        filtro = lambda x: x.assign(
+            data = lambda x: x.Data.dt.to_period("M").dt.to_timestamp(),
+            expec_ipca_12m = lambda x: x.Mediana
+            ),
+        agrupar_por = "data",
+        colunas_media = ["expec_ipca_12m"],
+        esquema = esquemas["Focus"],
+        decimal = ","
         )
     )
 
 # Constrói cenários para Hiato da inflação (inflacao_hiato)
 dados_cenario_inflacao_hiato = (
     dados_focus_expec_ipca_12m
-    .assign(
-        data = lambda x: x.Data.dt.to_period("M").dt.to_timestamp(),
-        expec_ipca_12m = lambda x: x.Mediana
-        )
-    .groupby("data", as_index = False)
-    .expec_ipca_12m
-    .mean()
-    .set_index("data")
     .join(
         other = (
             pd.concat([
@@ -242,7 +235,7 @@ previsao2 = (
 
 y.to_frame().join(x_teorico).to_csv("dados/selic.csv")
 prompt = f"""
-Assume that you are in {pd.to_datetime("today").strftime("%B %d, %Y")}. 
+Assume that you are in {data_hoje.strftime("%B %d, %Y")}. 
 Please give me your best forecast of Selic Target Interest Rate for Brazil, 
 measured in % per annum and published by Banco Central do Brasil, for {periodo_previsao.min().strftime("%B %Y")} 
 to {periodo_previsao.max().strftime("%B %Y")}. 
@@ -250,15 +243,12 @@ Use the historical Selic Target Interest Rate data from the attached CSV file
 named "selic.csv", where "selic" is the target column, "data" is the date column 
 and the others are exogenous variables. Please give me numeric values for these 
 forecasts, in a CSV like format with a header, and nothing more. Do not use any 
-information that was not available to you as of {pd.to_datetime("today").strftime("%B %d, %Y")} 
+information that was not available to you as of {data_hoje.strftime("%B %d, %Y")} 
 to formulate these forecasts.
 """
 
-genai.configure(api_key = os.environ["GEMINI_API_KEY"])
-modelo_ia = genai.GenerativeModel(model_name = "gemini-1.5-pro")
-arquivo = genai.upload_file("dados/selic.csv")
 previsao3 = pd.read_csv(
-    filepath_or_buffer = StringIO(modelo_ia.generate_content([prompt, arquivo]).text),
+    filepath_or_buffer = StringIO(gera_previsao_ia(prompt, "dados/selic.csv")),
     names = ["date", "Valor"],
     skiprows = 1,
     index_col = "date",
@@ -275,4 +265,4 @@ pd.concat(
     previsao1,
     previsao2,
     previsao3
-    ]).to_parquet("previsao/selic.parquet")
+    ]).pipe(compacta_base, "previsao/selic").to_parquet("previsao/selic.parquet")